@@ -0,0 +1,330 @@
+#!/usr/bin/env python3
+"""
+Benchmark suite for AI Dream Interpreter
+Measures the interpretation hot paths and cold start, and compares against a saved baseline
+
+Usage:
+    python benchmarks.py                          # run and print results
+    python benchmarks.py --save baseline.json     # run and save a baseline
+    python benchmarks.py --compare baseline.json  # run and fail on regressions
+"""
+
+import argparse
+import gc
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+
+# Fixed seed so every run benchmarks the same corpora
+SEED = 1234
+
+LEXICON_SIZES = [35, 1000, 10000, 50000]
+
+RULE_COUNTS = [1000, 10000]
+
+JOURNAL_SIZES = [100, 1000, 10000]
+
+# Simulated inference time of the stand-in OpenAI-compatible server, and requests per batch
+REMOTE_DELAY = 0.02
+REMOTE_BATCH = 16
+
+# Words used to build synthetic dreams, mixing symbols and filler
+FILLER_WORDS = (
+    "i was in a the and then suddenly my old with someone who felt like it "
+    "kept walking towards strange room bright sky but could not see anything "
+    "after that we started again back where everything looked different"
+).split()
+
+SYMBOL_WORDS = [
+    "flying", "falling", "water", "ocean", "fire", "dog", "cat", "snake", "spider",
+    "chase", "house", "home", "car", "bridge", "door", "lost", "mirror", "school",
+    "exam", "teacher", "family", "friend", "stranger", "darkness", "light", "forest",
+]
+
+DREAM_LENGTHS = {"short": 20, "long": 300, "very_long": 5000}
+CORPUS_SIZE = {"short": 500, "long": 100, "very_long": 10}
+
+# Every timed benchmark runs at least this many operations
+MIN_SAMPLES = 200
+
+# A metric is a regression if it gets this much worse than the baseline
+REGRESSION_TOLERANCE = 0.25
+
+# Latency changes smaller than this are treated as timer noise
+NOISE_FLOOR_MS = 0.05
+
+
+def make_corpus(length, count, rng):
+    """Build a fixed list of synthetic dreams with about length words each"""
+    corpus = []
+    for _ in range(count):
+        words = [rng.choice(SYMBOL_WORDS) if rng.random() < 0.1 else rng.choice(FILLER_WORDS)
+                 for _ in range(length)]
+        corpus.append(" ".join(words).capitalize() + ".")
+    return corpus
+
+
+def make_lexicon(size, rng):
+    """Extend the shipped lexicon with synthetic symbols up to the requested size, compiled like the real one"""
+    from dream_lexicon import DEFAULT_SOURCE_PATH, Lexicon, compile_lexicon, inflections_path, read_inflections, read_source
+
+    groups = read_source(DEFAULT_SOURCE_PATH)
+    terms = {term for group_terms, _ in groups for term in group_terms}
+    letters = "abcdefghijklmnopqrstuvwxyz"
+    while len(terms) < size:
+        word = "".join(rng.choice(letters) for _ in range(rng.randint(5, 10)))
+        if word not in terms:
+            terms.add(word)
+            groups.append(([word], f"meaning of {word}"))
+    return Lexicon(compile_lexicon(groups, read_inflections(inflections_path(DEFAULT_SOURCE_PATH))))
+
+
+def make_rules(count, rng):
+    """Extend the shipped rules with synthetic word-triggered rules up to the requested count"""
+    from dream_rules import DEFAULT_RULES_PATH, RuleEngine
+
+    with open(DEFAULT_RULES_PATH) as f:
+        specs = json.load(f)["rules"]
+    letters = "abcdefghijklmnopqrstuvwxyz"
+    stages = ["narrative", "symbol", "context", "emotion"]
+    while len(specs) < count:
+        word = "".join(rng.choice(letters) for _ in range(rng.randint(5, 10)))
+        specs.append({"stage": rng.choice(stages), "priority": rng.randint(0, 100),
+                      "when": {"words": [word]}, "text": f"Rule for {word}."})
+    return RuleEngine(specs)
+
+
+def measure(func, items, min_samples=MIN_SAMPLES):
+    """Run func over items and return latency percentiles, throughput and peak memory"""
+    items = list(items)
+    repeat = max(1, -(-min_samples // len(items)))
+    latencies = []
+
+    # Like timeit, keep the garbage collector from adding random pauses
+    gc.collect()
+    gc.disable()
+    try:
+        started = time.perf_counter()
+        for _ in range(repeat):
+            for item in items:
+                t0 = time.perf_counter()
+                func(item)
+                latencies.append(time.perf_counter() - t0)
+        elapsed = time.perf_counter() - started
+    finally:
+        gc.enable()
+
+    # Memory is traced in a separate pass so tracing overhead does not skew timings
+    tracemalloc.start()
+    for item in items:
+        func(item)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    latencies.sort()
+    return {
+        "ops_per_sec": len(latencies) / elapsed,
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p95_ms": percentile(latencies, 95) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+        "peak_kb": peak / 1024,
+    }
+
+
+def percentile(sorted_values, pct):
+    index = min(len(sorted_values) - 1, int(round(pct / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def bench_import(runs=5):
+    """Time importing dream_interpreter in fresh processes"""
+    script = "import time; t = time.perf_counter(); import dream_interpreter; print(time.perf_counter() - t)"
+    times = []
+    for _ in range(runs):
+        result = subprocess.run([sys.executable, "-c", script], capture_output=True, text=True, check=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__)))
+        times.append(float(result.stdout.strip()))
+    times.sort()
+    return {"p50_ms": statistics.median(times) * 1000, "max_ms": times[-1] * 1000}
+
+
+def run_benchmarks(quick=False):
+    from dream_interpreter import DreamInterpreter, create_dream_journal_entry
+
+    rng = random.Random(SEED)
+    corpora = {name: make_corpus(length, 5 if quick else CORPUS_SIZE[name], rng)
+               for name, length in DREAM_LENGTHS.items()}
+    lexicon_sizes = LEXICON_SIZES[:2] if quick else LEXICON_SIZES
+    lexicons = {size: make_lexicon(size, rng) for size in lexicon_sizes}
+    results = {}
+
+    results["import"] = bench_import(2 if quick else 5)
+
+    for size in lexicon_sizes:
+        results[f"lexicon_load/lexicon={size}"] = bench_lexicon_load(lexicons[size])
+
+    for size, lexicon in lexicons.items():
+        results[f"construct/lexicon={size}"] = measure(lambda _: DreamInterpreter(symbols=lexicon), range(3), min_samples=3)
+
+    for size, lexicon in lexicons.items():
+        interpreter = DreamInterpreter(symbols=lexicon)
+        for name, corpus in corpora.items():
+            results[f"identify_symbols/{name}/lexicon={size}"] = measure(interpreter.identify_symbols, corpus)
+
+    interpreter = DreamInterpreter()
+    for name, corpus in corpora.items():
+        symbols = {dream: interpreter.identify_symbols(dream) for dream in corpus}
+        results[f"interpretation/{name}"] = measure(
+            lambda dream: interpreter.create_comprehensive_interpretation(dream, "Anxious", "work stress", symbols[dream]),
+            corpus,
+        )
+        interpretations = {dream: interpreter.create_comprehensive_interpretation(dream, "Anxious", "", symbols[dream])
+                           for dream in corpus}
+        results[f"journal_entry/{name}"] = measure(
+            lambda dream: create_dream_journal_entry(dream, "Anxious", "", interpretations[dream], symbols[dream]),
+            corpus,
+        )
+
+    for count in RULE_COUNTS[:1] if quick else RULE_COUNTS:
+        interpreter = DreamInterpreter(rules=make_rules(count, rng))
+        corpus = corpora["short"]
+        symbols = {dream: interpreter.identify_symbols(dream) for dream in corpus}
+        results[f"interpretation/short/rules={count}"] = measure(
+            lambda dream: interpreter.create_comprehensive_interpretation(dream, "Anxious", "work stress", symbols[dream]),
+            corpus,
+        )
+
+    for size in JOURNAL_SIZES[:2] if quick else JOURNAL_SIZES:
+        results[f"similar_dreams/entries={size}"] = bench_similar(size, corpora["short"], rng)
+
+    results.update(bench_remote(corpora["short"], quick))
+
+    return results
+
+
+def bench_lexicon_load(lexicon):
+    """Time memory-mapping a compiled lexicon file and the first lookup through it"""
+    import tempfile
+    from dream_lexicon import Lexicon
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "bench.lex")
+        with open(path, "wb") as f:
+            f.write(lexicon.buffer)
+        return measure(lambda _: Lexicon.load(path).lookup("water"), range(20), min_samples=20)
+
+
+def bench_similar(size, corpus, rng):
+    """Time the similar-dreams lookup over a journal of size entries"""
+    import tempfile
+    from dream_interpreter import DreamInterpreter, create_dream_journal_entry
+    from dream_journal import JournalStore
+    from dream_similarity import SimilarityIndex
+
+    interpreter = DreamInterpreter()
+    with tempfile.TemporaryDirectory() as directory:
+        store = JournalStore(":memory:")
+        for dream in make_corpus(DREAM_LENGTHS["short"], size, rng):
+            store.append("bench", create_dream_journal_entry(dream, "Anxious", "", "", interpreter.identify_symbols(dream)))
+        index = SimilarityIndex(directory)
+        index.sync("bench", store)
+        features = {dream: interpreter.extract_features(dream) for dream in corpus}
+        return measure(lambda dream: index.similar("bench", store, features[dream]), corpus)
+
+
+def bench_remote(corpus, quick=False):
+    """Time the OpenAI-compatible backend against the local stand-in server"""
+    from dream_interpreter import DreamInterpreter
+    from dream_openai import OpenAICompatibleClient, StubCompletionServer
+
+    stub = StubCompletionServer(delay=REMOTE_DELAY).start()
+    client = OpenAICompatibleClient(stub.url, max_concurrency=8)
+    interpreter = DreamInterpreter(backend="openai", client=client)
+    requests = [(dream, "Anxious", "", [], None) for dream in corpus]
+    batches = [requests[i:i + REMOTE_BATCH] for i in range(0, len(requests), REMOTE_BATCH)]
+    try:
+        # Warm up the client and its connection pool
+        interpreter.generate_interpretations(batches[0])
+        return {
+            "remote/single": measure(lambda request: interpreter.generate_interpretations([request]),
+                                     requests[:10], min_samples=10 if quick else 50),
+            f"remote/batch={REMOTE_BATCH}": measure(interpreter.generate_interpretations,
+                                                    batches[:5], min_samples=5 if quick else 20),
+        }
+    finally:
+        client.close()
+        stub.close()
+
+
+def compare(results, baseline, tolerance=REGRESSION_TOLERANCE):
+    """Return a list of (benchmark, metric, baseline, current) regressions"""
+    regressions = []
+    for name, metrics in results.items():
+        for metric, value in metrics.items():
+            base = baseline.get(name, {}).get(metric)
+            if not base:
+                continue
+            # Throughput regresses downwards, everything else upwards
+            if metric == "ops_per_sec":
+                worse = value < base * (1 - tolerance)
+                noise = 1000 / value - 1000 / base < NOISE_FLOOR_MS
+            else:
+                worse = value > base * (1 + tolerance)
+                noise = metric.endswith("_ms") and value - base < NOISE_FLOOR_MS
+            if worse and not noise:
+                regressions.append((name, metric, base, value))
+    return regressions
+
+
+def print_results(results):
+    print(f"{'benchmark':<44} {'ops/s':>10} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'peak KB':>10}")
+    print("-" * 95)
+    for name, m in results.items():
+        if "ops_per_sec" in m:
+            print(f"{name:<44} {m['ops_per_sec']:>10.1f} {m['p50_ms']:>9.3f} {m['p95_ms']:>9.3f} "
+                  f"{m['p99_ms']:>9.3f} {m['peak_kb']:>10.1f}")
+        else:
+            print(f"{name:<44} {'':>10} {m['p50_ms']:>9.3f} {'max':>9} {m['max_ms']:>9.3f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the dream interpretation hot paths")
+    parser.add_argument("--save", metavar="PATH", help="save results as a baseline JSON file")
+    parser.add_argument("--compare", metavar="PATH", help="compare against a saved baseline")
+    parser.add_argument("--tolerance", type=float, default=REGRESSION_TOLERANCE,
+                        help="allowed relative slowdown before a metric counts as a regression")
+    parser.add_argument("--quick", action="store_true", help="small corpora and lexicons, for smoke runs")
+    args = parser.parse_args()
+
+    print("⏱️  AI Dream Interpreter - Benchmarks")
+    print("=" * 50)
+
+    results = run_benchmarks(quick=args.quick)
+    print_results(results)
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"\n💾 Baseline saved to {args.save}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print(f"\n❌ {len(regressions)} regressions against {args.compare}:")
+            for name, metric, base, value in regressions:
+                print(f"   {name} {metric}: {base:.3f} -> {value:.3f}")
+            return 1
+        print(f"\n✅ No regressions against {args.compare}")
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,337 @@
+#!/usr/bin/env python3
+"""
+Headless JSON API for AI Dream Interpreter
+
+A plain ASGI application, so it runs under any ASGI server:
+
+    python dream_api.py --port 8000 --workers 4
+    uvicorn dream_api:create_app --factory --port 8000
+
+Endpoints:
+    POST /interpret                 {"dream", "emotion", "context", "journal_id"} -> journal entry
+    POST /interpret/batch           {"dreams": [...]} -> {"entries": [...]}
+    GET  /journal/{id}?page=&day=   one page of a journal, newest first
+    GET  /journal/{id}/days         entry counts per day
+    GET  /health
+
+Interpretation and journal access run in a bounded thread pool. When
+max_pending jobs are already queued, requests are refused with 503 instead
+of piling up, and jobs that take longer than timeout seconds answer 504.
+A 504 means nothing was saved: a timed-out job is abandoned before it
+writes to the journal, so clients can safely retry.
+"""
+
+import asyncio
+import json
+import os
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qs
+
+from dream_interpreter import (BACKENDS, JOURNAL_PAGE_SIZE, DreamInterpreter, InterpretationCache,
+                               create_dream_journal_entry, model_options)
+from dream_journal import DEFAULT_JOURNAL_PATH, JournalStore, valid_journal_id
+from dream_metrics import METRICS
+
+JOURNAL_ROUTE = re.compile(r"^/journal/([A-Za-z0-9_-]{1,64})(/days)?$")
+DAY_PATTERN = re.compile(r"^\d{4}-\d{2}-\d{2}$")
+
+
+class ApiError(Exception):
+    """An error answered with an HTTP status and a JSON {"error": message} body"""
+
+    def __init__(self, status, message, headers=()):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+        self.headers = list(headers)
+
+
+class Job:
+    """Decides, once, whether a job gets to save its results or was abandoned by a timeout"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.abandoned = False
+        self.saving = False
+
+    def start_saving(self):
+        """Called by the job before writing; False if its request already timed out"""
+        with self.lock:
+            self.saving = not self.abandoned
+            return self.saving
+
+    def abandon(self):
+        """Called on timeout; False if the job is already saving and must be waited for"""
+        with self.lock:
+            self.abandoned = not self.saving
+            return self.abandoned
+
+
+class DreamAPI:
+    """ASGI application serving interpretations and journals as JSON"""
+
+    def __init__(self, interpreter=None, journal=None, workers=None, max_pending=None, timeout=10.0,
+                 max_batch_size=64, max_body_size=1 << 20):
+        self.interpreter = interpreter if interpreter is not None else DreamInterpreter()
+        self.journal = journal
+        self.workers = workers or os.cpu_count() or 1
+        self.executor = ThreadPoolExecutor(self.workers, thread_name_prefix="dream-api")
+        self.timeout = timeout
+        self.max_batch_size = max_batch_size
+        self.max_body_size = max_body_size
+
+        # Backpressure: a slot is held from submission until the job finishes,
+        # even if its request already timed out
+        self.max_pending = max_pending or self.workers * 4
+        self.slots = threading.BoundedSemaphore(self.max_pending)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            await self.lifespan(receive, send)
+            return
+        if scope["type"] != "http":
+            return
+
+        try:
+            with METRICS.timer("api_request"):
+                status, body = await self.route(scope, receive)
+            headers = []
+        except ApiError as e:
+            status, body, headers = e.status, {"error": e.message}, e.headers
+
+        payload = json.dumps(body, ensure_ascii=False).encode("utf-8")
+        await send({
+            "type": "http.response.start",
+            "status": status,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(payload)).encode()),
+                *headers,
+            ],
+        })
+        await send({"type": "http.response.body", "body": payload})
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                self.close()
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    async def route(self, scope, receive):
+        method = scope["method"]
+        path = scope["path"].rstrip("/") or "/"
+
+        if path == "/interpret":
+            self.require_method(method, "POST")
+            record = self.parse_record(await self.read_json(receive))
+            return 200, await self.run(self.interpret, record, saves=True)
+
+        if path == "/interpret/batch":
+            self.require_method(method, "POST")
+            body = await self.read_json(receive)
+            dreams = body.get("dreams") if isinstance(body, dict) else None
+            if not isinstance(dreams, list) or not dreams:
+                raise ApiError(400, "Expected a non-empty dreams list")
+            if len(dreams) > self.max_batch_size:
+                raise ApiError(413, f"At most {self.max_batch_size} dreams per batch")
+            records = [self.parse_record(record) for record in dreams]
+            return 200, {"entries": await self.run(self.interpret_batch, records, saves=True)}
+
+        if path == "/health":
+            self.require_method(method, "GET")
+            return 200, {"status": "ok", "backend": self.interpreter.backend}
+
+        match = JOURNAL_ROUTE.match(path)
+        if match:
+            self.require_method(method, "GET")
+            journal_id, days = match.groups()
+            if days:
+                return 200, await self.run(self.journal_days, journal_id)
+            query = parse_qs(scope.get("query_string", b"").decode("latin-1"))
+            page = self.parse_page(query.get("page", ["0"])[0])
+            day = query.get("day", [None])[0]
+            if day is not None and not DAY_PATTERN.match(day):
+                raise ApiError(400, "day must be YYYY-MM-DD")
+            return 200, await self.run(self.journal_page, journal_id, page, day)
+
+        raise ApiError(404, "Not found")
+
+    @staticmethod
+    def require_method(method, allowed):
+        if method != allowed:
+            raise ApiError(405, f"Use {allowed}", [(b"allow", allowed.encode())])
+
+    @staticmethod
+    def parse_page(value):
+        try:
+            page = int(value)
+        except ValueError:
+            raise ApiError(400, "page must be an integer")
+        if page < 0:
+            raise ApiError(400, "page must not be negative")
+        return page
+
+    async def read_json(self, receive):
+        """Read the request body, refusing bodies over max_body_size"""
+        chunks = []
+        size = 0
+        while True:
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                raise ApiError(400, "Client disconnected")
+            chunk = message.get("body", b"")
+            size += len(chunk)
+            if size > self.max_body_size:
+                raise ApiError(413, "Request body too large")
+            chunks.append(chunk)
+            if not message.get("more_body", False):
+                break
+
+        try:
+            return json.loads(b"".join(chunks))
+        except ValueError:
+            raise ApiError(400, "Request body is not valid JSON")
+
+    @staticmethod
+    def parse_record(record):
+        """Validate one interpretation request; returns (dream, emotion, context, journal_id)"""
+        if not isinstance(record, dict):
+            raise ApiError(400, "Expected a JSON object")
+        dream_text = record.get("dream")
+        emotion = record.get("emotion", "Other")
+        context = record.get("context", "")
+        journal_id = record.get("journal_id")
+        if not isinstance(dream_text, str) or not dream_text.strip():
+            raise ApiError(400, "dream must be a non-empty string")
+        if not isinstance(emotion, str) or not isinstance(context, str):
+            raise ApiError(400, "emotion and context must be strings")
+        if journal_id is not None and not valid_journal_id(journal_id):
+            raise ApiError(400, "journal_id must be 1-64 letters, digits, - or _")
+        return dream_text, emotion, context, journal_id
+
+    async def run(self, func, *args, saves=False):
+        """Run a job in the executor, with backpressure and a timeout
+
+        Jobs that save get a Job as their last argument and must call
+        start_saving() before writing anything.
+        """
+        if not self.slots.acquire(blocking=False):
+            METRICS.inc("api_rejected")
+            raise ApiError(503, "Server busy, retry later", [(b"retry-after", b"1")])
+        job = Job()
+        try:
+            future = self.executor.submit(func, *args, job) if saves else self.executor.submit(func, *args)
+        except RuntimeError:
+            self.slots.release()
+            raise ApiError(503, "Server shutting down")
+        future.add_done_callback(lambda _: self.slots.release())
+
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(future), self.timeout)
+        except asyncio.TimeoutError:
+            if not job.abandon():
+                # Already writing to the journal: answer with what was saved rather than a 504
+                return await asyncio.wrap_future(future)
+            METRICS.inc("api_timeout")
+            raise ApiError(504, "Interpretation timed out")
+
+    def get_journal(self):
+        if self.journal is None:
+            raise ApiError(501, "Journal storage is not configured")
+        return self.journal
+
+    def save(self, journal_id, entry):
+        if journal_id is not None:
+            entry = dict(entry, id=self.get_journal().append(journal_id, entry))
+        return entry
+
+    @staticmethod
+    def check_saving(job):
+        if not job.start_saving():
+            # The client already got a 504; leave the journal untouched
+            raise ApiError(504, "Interpretation timed out")
+
+    def interpret(self, record, job):
+        dream_text, emotion, context, journal_id = record
+        features = self.interpreter.extract_features(dream_text)
+        interpretation = self.interpreter.generate_interpretation(
+            dream_text, emotion, context, features.symbols, features
+        )
+        entry = create_dream_journal_entry(dream_text, emotion, context, interpretation, features.symbols)
+        self.check_saving(job)
+        return self.save(journal_id, entry)
+
+    def interpret_batch(self, records, job):
+        requests = []
+        for dream_text, emotion, context, _ in records:
+            features = self.interpreter.extract_features(dream_text)
+            requests.append((dream_text, emotion, context, features.symbols, features))
+
+        # One batched call, so model backends generate all the dreams together
+        interpretations = self.interpreter.generate_interpretations(requests)
+        self.check_saving(job)
+        entries = []
+        for (dream_text, emotion, context, journal_id), request, interpretation in zip(records, requests, interpretations):
+            entry = create_dream_journal_entry(dream_text, emotion, context, interpretation, request[3])
+            entries.append(self.save(journal_id, entry))
+        return entries
+
+    def journal_page(self, journal_id, page, day):
+        journal = self.get_journal()
+        return {
+            "journal_id": journal_id,
+            "page": page,
+            "page_size": JOURNAL_PAGE_SIZE,
+            "total": journal.count(journal_id, day),
+            "entries": journal.page(journal_id, page, JOURNAL_PAGE_SIZE, day),
+        }
+
+    def journal_days(self, journal_id):
+        days = self.get_journal().days(journal_id)
+        return {"journal_id": journal_id, "days": [{"day": day, "count": count} for day, count in days]}
+
+    def close(self):
+        self.executor.shutdown(wait=True)
+        if self.journal is not None:
+            self.journal.close()
+
+
+def create_app():
+    """Build the API from the same environment variables as the Streamlit app"""
+    backend = os.environ.get("DREAM_INTERPRETER_BACKEND", "rules")
+    cache = InterpretationCache(path=os.environ.get("DREAM_INTERPRETER_CACHE"))
+    return DreamAPI(
+        interpreter=DreamInterpreter(backend=backend, cache=cache, **model_options()),
+        journal=JournalStore(os.environ.get("DREAM_JOURNAL_DB", DEFAULT_JOURNAL_PATH)),
+        workers=int(os.environ.get("DREAM_API_THREADS", "0")) or None,
+        timeout=float(os.environ.get("DREAM_API_TIMEOUT", "10")),
+    )
+
+
+def main(argv=None):
+    import argparse
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Serve the dream interpreter as a JSON API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=1,
+                        help="server processes; the lexicon is memory-mapped and shared between them, "
+                             "and so are the model weights with DREAM_SHARED_WEIGHTS=1")
+    parser.add_argument("--backend", choices=BACKENDS, default=None)
+    args = parser.parse_args(argv)
+
+    if args.backend:
+        os.environ["DREAM_INTERPRETER_BACKEND"] = args.backend
+    uvicorn.run("dream_api:create_app", factory=True, host=args.host, port=args.port,
+                workers=args.workers, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
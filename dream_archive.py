@@ -0,0 +1,228 @@
+#!/usr/bin/env python3
+"""
+Compact, streaming export and import of dream journals
+
+An archive is gzip-compressed JSONL. The first line is a header, then each
+entry is a JSON array with its symbols as lexicon term ids:
+
+    {"format": "dream-journal", "version": 1, "journal_id": "...", "fields": [...]}
+    {"symbol": 12, "term": "water", "meaning": "emotions, the unconscious, ..."}
+    ["2024-01-17 08:30:00", "I was swimming ...", "Calm", "", "Water in dreams ...", [12]]
+
+Each symbol's term and meaning are written once, before its first use, so an
+archive can be read on a device with a different lexicon version. Symbols
+that are not in the lexicon, or whose saved meaning differs from it, get
+negative ids. Entries are read and written in chunks, so memory use does not
+grow with the journal. Malformed entries, such as one with an invalid date,
+are skipped on import and counted. Usage:
+
+    python dream_archive.py export JOURNAL_ID journal.jsonl.gz [--db dream_journal.db]
+    python dream_archive.py import journal.jsonl.gz [JOURNAL_ID] [--db dream_journal.db]
+"""
+
+import datetime
+import gzip
+import json
+import sys
+
+from dream_journal import DEFAULT_JOURNAL_PATH, JournalStore
+from dream_lexicon import normalize_term
+
+ARCHIVE_FORMAT = "dream-journal"
+ARCHIVE_VERSION = 1
+FIELDS = ["date", "dream", "emotion", "context", "interpretation", "symbols"]
+
+# Entries per database read or write
+CHUNK_SIZE = 1000
+
+
+class SymbolTable:
+    """Assigns archive ids to (symbol, meaning) pairs, preferring lexicon term ids"""
+
+    def __init__(self, lexicon):
+        self.lexicon = lexicon
+        self.ids = {}
+        self.next_local_id = -1
+
+    def encode(self, symbol, meaning, definitions):
+        """Return the id of a symbol, adding its definition line the first time it is seen"""
+        symbol_id = self.ids.get((symbol, meaning))
+        if symbol_id is None:
+            symbol_id = self.lexicon_id(symbol, meaning)
+            if symbol_id is None:
+                symbol_id = self.next_local_id
+                self.next_local_id -= 1
+            self.ids[symbol, meaning] = symbol_id
+            definitions.append(json.dumps({"symbol": symbol_id, "term": symbol, "meaning": meaning},
+                                          ensure_ascii=False))
+        return symbol_id
+
+    def lexicon_id(self, symbol, meaning):
+        find = getattr(self.lexicon, "find", None)
+        if find is None:
+            return None
+        term_id = find(normalize_term(symbol))
+        if term_id is None or self.lexicon.get(symbol) != meaning:
+            return None
+        return term_id
+
+
+def write_archive(entries, file, journal_id=None, lexicon=None, chunk_size=CHUNK_SIZE):
+    """Write journal entries to a binary file as a compressed archive; returns the entry count"""
+    if lexicon is None:
+        from dream_interpreter import DREAM_SYMBOLS
+        lexicon = DREAM_SYMBOLS
+
+    symbols = SymbolTable(lexicon)
+    count = 0
+    with gzip.GzipFile(fileobj=file, mode="wb") as archive:
+        header = {"format": ARCHIVE_FORMAT, "version": ARCHIVE_VERSION, "journal_id": journal_id, "fields": FIELDS}
+        archive.write((json.dumps(header) + "\n").encode("utf-8"))
+
+        lines = []
+        for entry in entries:
+            symbol_ids = [symbols.encode(s["symbol"], s["meaning"], lines) for s in entry["symbols"]]
+            lines.append(json.dumps([entry["date"], entry["dream"], entry["emotion"], entry["context"],
+                                     entry["interpretation"], symbol_ids], ensure_ascii=False))
+            count += 1
+            if len(lines) >= chunk_size:
+                archive.write(("\n".join(lines) + "\n").encode("utf-8"))
+                lines = []
+        if lines:
+            archive.write(("\n".join(lines) + "\n").encode("utf-8"))
+    return count
+
+
+def parse_entry(record, symbols):
+    """Turn an archived entry array into a journal entry; raises ValueError if it is malformed"""
+    if not isinstance(record, list) or len(record) != len(FIELDS):
+        raise ValueError("not an entry array")
+    date, dream, emotion, context, interpretation, symbol_ids = record
+    if not all(isinstance(value, str) for value in (date, dream, emotion, context, interpretation)):
+        raise ValueError("entry fields must be strings")
+    try:
+        datetime.datetime.fromisoformat(date)
+    except ValueError:
+        raise ValueError(f"invalid date {date!r}") from None
+    if not isinstance(symbol_ids, list) or any(symbol_id not in symbols for symbol_id in symbol_ids):
+        raise ValueError("unknown symbol id")
+    return {
+        "date": date,
+        "dream": dream,
+        "emotion": emotion,
+        "context": context,
+        "interpretation": interpretation,
+        "symbols": [symbols[symbol_id] for symbol_id in symbol_ids],
+    }
+
+
+def read_archive(file, skipped=None):
+    """Read a compressed archive from a binary file; returns (header, iterator of entries)
+
+    A malformed entry raises ValueError naming its line, unless a skipped list
+    is given, in which case its (line number, reason) is appended and it is left out.
+    """
+    archive = gzip.GzipFile(fileobj=file, mode="rb")
+    header = json.loads(archive.readline())
+    if header.get("format") != ARCHIVE_FORMAT:
+        raise ValueError("Not a dream journal archive")
+    if header.get("version") != ARCHIVE_VERSION:
+        raise ValueError(f"Unsupported dream journal archive version {header.get('version')}")
+
+    def entries():
+        symbols = {}
+        for number, line in enumerate(archive, 2):
+            try:
+                record = json.loads(line)
+                if isinstance(record, dict):
+                    symbols[record["symbol"]] = {"symbol": record["term"], "meaning": record["meaning"]}
+                    continue
+                entry = parse_entry(record, symbols)
+            except (ValueError, KeyError, TypeError) as e:
+                if skipped is None:
+                    raise ValueError(f"Malformed archive line {number}: {e}") from None
+                skipped.append((number, str(e)))
+                continue
+            yield entry
+
+    return header, entries()
+
+
+def journal_entries(store, journal_id, chunk_size=CHUNK_SIZE):
+    """Yield every entry of a journal, oldest first, chunk_size rows at a time"""
+    after_id = 0
+    while True:
+        rows = store.since(journal_id, after_id, chunk_size)
+        if not rows:
+            return
+        for _, entry in rows:
+            yield entry
+        after_id = rows[-1][0]
+
+
+def export_journal(store, journal_id, file, lexicon=None, chunk_size=CHUNK_SIZE):
+    """Export a journal to a binary file; returns the number of entries"""
+    return write_archive(journal_entries(store, journal_id, chunk_size), file, journal_id, lexicon, chunk_size)
+
+
+def import_journal(store, file, journal_id=None, chunk_size=CHUNK_SIZE):
+    """Import an archive into a journal, by default the one it was exported from
+
+    Returns (journal id, number of entries, number of malformed entries skipped).
+    """
+    skipped = []
+    header, entries = read_archive(file, skipped)
+    journal_id = journal_id or header["journal_id"]
+    if not journal_id:
+        raise ValueError("The archive names no journal; pass a journal id")
+
+    count = 0
+    chunk = []
+    for entry in entries:
+        chunk.append(entry)
+        if len(chunk) >= chunk_size:
+            count += len(store.append_many(journal_id, chunk))
+            chunk = []
+    if chunk:
+        count += len(store.append_many(journal_id, chunk))
+    return journal_id, count, len(skipped)
+
+
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Export and import dream journals as compact archives")
+    parser.add_argument("--db", default=DEFAULT_JOURNAL_PATH, help="journal database")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    export_parser = subparsers.add_parser("export", help="write a journal to an archive")
+    export_parser.add_argument("journal_id")
+    export_parser.add_argument("archive", help="output file; - for stdout")
+    import_parser = subparsers.add_parser("import", help="add an archive's entries to a journal")
+    import_parser.add_argument("archive", help="input file; - for stdin")
+    import_parser.add_argument("journal_id", nargs="?", help="target journal (default: the exported one)")
+    args = parser.parse_args(argv)
+
+    store = JournalStore(args.db)
+    try:
+        if args.command == "export":
+            if args.archive == "-":
+                count = export_journal(store, args.journal_id, sys.stdout.buffer)
+            else:
+                with open(args.archive, "wb") as f:
+                    count = export_journal(store, args.journal_id, f)
+            print(f"Exported {count} dreams from journal {args.journal_id}", file=sys.stderr)
+        else:
+            if args.archive == "-":
+                journal_id, count, skipped = import_journal(store, sys.stdin.buffer, args.journal_id)
+            else:
+                with open(args.archive, "rb") as f:
+                    journal_id, count, skipped = import_journal(store, f, args.journal_id)
+            print(f"Imported {count} dreams into journal {journal_id} ({skipped} malformed entries skipped)",
+                  file=sys.stderr)
+    finally:
+        store.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,87 +1,453 @@
-import streamlit as st
-import openai
-from transformers import GPT2LMHeadModel, GPT2Tokenizer
-import torch
 import json
 import datetime
-import re
-
-# Dream symbols database
-DREAM_SYMBOLS = {
-    
-    "flying": "freedom, liberation, rising above challenges, spiritual ascension",
-    "falling": "loss of control, fear of failure, anxiety, insecurity",
-    "water": "emotions, subconscious, purification, life changes",
-    "ocean": "vast emotions, the unconscious mind, feeling overwhelmed",
-    "fire": "passion, destruction, transformation, anger",
-    "animals": "instincts, natural self, specific traits of the animal",
-    "dog": "loyalty, friendship, protection, or something pursuing you",
-    "cat": "independence, mystery, feminine energy, intuition",
-    "snake": "transformation, healing, hidden knowledge, sexuality",
-    "spider": "creativity, feminine power, feeling trapped, web of relationships",
-    "death": "transformation, ending of a phase, rebirth",
-    "dying": "transformation, ending of a phase, rebirth",
-    "chase": "avoidance, running from problems, fear, being pursued",
-    "chasing": "avoidance, running from problems, fear, being pursued", 
-    "running": "trying to escape, avoidance, urgency",
-    "house": "self, psyche, different aspects of personality",
-    "home": "security, family, your inner self",
-    "car": "control over life direction, personal drive",
-    "driving": "control over life direction, personal autonomy",
-    "bridge": "transition, connection, overcoming obstacles",
-    "door": "opportunities, new beginnings, the unknown",
-    "lost": "confusion, searching for direction, feeling overwhelmed",
-    "mirror": "self-reflection, truth, self-awareness",
-    "school": "learning, being tested, childhood memories",
-    "exam": "being tested, performance anxiety, evaluation",
-    "teacher": "authority, learning, guidance",
-    "family": "relationships, support systems, childhood influences",
-    "friend": "aspects of yourself, social connections",
-    "stranger": "unknown aspects of self, new experiences",
-    "darkness": "unknown, fear, subconscious, hidden aspects",
-    "light": "knowledge, clarity, hope, spiritual guidance",
-    "forest": "the unknown, natural self, getting lost",
-    "mountain": "challenges, goals, spiritual ascension",
-    "falling": "loss of control, fear of failure, anxiety"
-}
+import hashlib
+import logging
+import os
+import queue
+import sqlite3
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import Future
+
+from dream_journal import DEFAULT_JOURNAL_PATH, JournalStore, valid_journal_id
+from dream_lexicon import PREFIX_ONLY, WORD_PATTERN, Lexicon, load_lexicon, normalize_term
+from dream_metrics import METRICS
+from dream_rules import load_rules
+
+# Heavy dependencies (streamlit, transformers, torch) are imported where they
+# are first needed so that importing this module and building a rule-based
+# DreamInterpreter stays fast.
+
+logger = logging.getLogger(__name__)
+
+# Dream symbols database, loaded from dream_symbols.json through its compiled,
+# memory-mapped form (see dream_lexicon.py)
+DREAM_SYMBOLS = load_lexicon()
+
+# Narrative, symbol, context and emotion rules, loaded from dream_rules.json
+# and indexed by trigger (see dream_rules.py)
+DREAM_RULES = load_rules()
+
+# Journal entries shown per page on the Dream Journal page
+JOURNAL_PAGE_SIZE = 10
+
+# Dream Patterns grouping options: label -> (counter period, buckets shown)
+PATTERN_PERIODS = {"Daily": ("day", 30), "Weekly": ("week", 26), "Monthly": ("month", 12)}
+
+class SymbolMatch:
+    """A single symbol occurrence in a dream text"""
+    __slots__ = ("symbol", "meaning", "start", "end")
+
+    def __init__(self, symbol, meaning, start, end):
+        self.symbol = symbol
+        self.meaning = meaning
+        self.start = start
+        self.end = end
+
+    def __repr__(self):
+        return f"SymbolMatch({self.symbol!r}, start={self.start}, end={self.end})"
+
+
+class SymbolMatcher:
+    """Phrase index over a symbol table, matched in a single pass over the text
+
+    The index is built once per symbol table: a compiled Lexicon is used as is,
+    without copying it, and any other mapping is indexed into a dict. Matching
+    tokenizes the text once and does one O(1) lookup per token (and per extra
+    word of multi-word symbols), so the cost depends on the text length, not on
+    the number of symbols.
+    """
+
+    def __init__(self, symbols):
+        self.symbols = symbols
+
+        if isinstance(symbols, Lexicon):
+            self.lookup = symbols.lookup
+            self.max_words = symbols.max_words
+            return
+
+        index = {}
+        self.max_words = 0
+        for symbol, meaning in symbols.items():
+            phrase = normalize_term(symbol)
+            if not phrase:
+                continue
+            words = phrase.split(" ")
+            # Prefixes of multi-word symbols tell the matcher to keep extending
+            for n in range(1, len(words)):
+                index.setdefault(" ".join(words[:n]), PREFIX_ONLY)
+            index[phrase] = (symbol, meaning)
+            self.max_words = max(self.max_words, len(words))
+        self.lookup = index.get
+
+    def find_all(self, text):
+        """Return every symbol occurrence in the text, with character offsets"""
+        return self.match_tokens(tokenize(text))
+
+    def match_tokens(self, tokens):
+        """Return every symbol occurrence in an already tokenized text"""
+        matches = []
+        lookup = self.lookup
+
+        for i, (phrase, start, _) in enumerate(tokens):
+            j = i
+            while True:
+                found = lookup(phrase)
+                if found is None:
+                    break
+                if found is not PREFIX_ONLY:
+                    matches.append(SymbolMatch(found[0], found[1], start, tokens[j][2]))
+                j += 1
+                if j >= len(tokens) or j - i >= self.max_words:
+                    break
+                phrase += " " + tokens[j][0]
+
+        return matches
+
+    def identify(self, text):
+        """Return unique (symbol, meaning) pairs in order of first appearance"""
+        return unique_symbols(self.find_all(text))
+
+
+def tokenize(text):
+    """Split text into lowercase (word, start, end) tokens, with curly apostrophes made straight"""
+    return [(m.group().lower().replace("’", "'"), m.start(), m.end()) for m in WORD_PATTERN.finditer(text)]
+
+
+def unique_symbols(matches):
+    """Collapse symbol matches into unique (symbol, meaning) pairs"""
+    found = {}
+    for match in matches:
+        if match.symbol not in found:
+            found[match.symbol] = match.meaning
+    return list(found.items())
+
+
+class DreamFeatures:
+    """Everything the analyzers need from a dream text, extracted in one pass
+
+    Built once per request: the text is tokenized a single time, and the token
+    positions and matched symbols are shared by every analysis stage.
+    """
+
+    def __init__(self, dream_text, matcher):
+        self.text = dream_text
+        tokens = tokenize(dream_text)
+        self.words = [word for word, _, _ in tokens]
+        self.positions = {}
+        for i, word in enumerate(self.words):
+            self.positions.setdefault(word, []).append(i)
+        self.matches = matcher.match_tokens(tokens)
+        self.symbols = unique_symbols(self.matches)
+        self.symbol_names = {symbol for symbol, _ in self.symbols}
+        
+        # Rule facts for each (rules, emotion, context) this dream is analyzed with
+        self.rule_facts = {}
+
+
+# Interpretation backends; "rules" needs no model, the others load a model or
+# client on first use ("openai" is any OpenAI-compatible endpoint, see dream_openai.py)
+BACKENDS = ("rules", "gpt2", "openai")
+
 
 class DreamInterpreter:
-    def __init__(self):
+    def __init__(self, symbols=None, backend="rules", model_name="gpt2-medium",
+                 num_threads=None, quantize=True, max_new_tokens=80, latency_budget=5.0, cache=None,
+                 rules=None, client=None, share_weights=False, max_streams=2):
+        if backend not in BACKENDS:
+            raise ValueError(f"Unknown backend {backend!r}, expected one of {BACKENDS}")
         self.tokenizer = None
         self.model = None
-        self.setup_model()
+        self.model_name = model_name
+        self.backend = backend
+        self.model_attempted = False
+        # Why the model or client could not be loaded, for the UI to report
+        self.load_error = None
+        # The scheduler thread and streaming sessions share one interpreter
+        self.model_lock = threading.Lock()
+        self.client = client
+        
+        # CPU generation settings
+        self.num_threads = num_threads
+        self.quantize = quantize
+        self.share_weights = share_weights
+        self.max_new_tokens = max_new_tokens
+        self.latency_budget = latency_budget
+        
+        # Each model stream runs its own unbatched generate call, so only a few run at once
+        self.stream_slots = threading.BoundedSemaphore(max_streams)
+        self.symbols = symbols if symbols is not None else DREAM_SYMBOLS
+        self.matcher = SymbolMatcher(self.symbols)
+        self.rules = rules if rules is not None else DREAM_RULES
+        self.cache = cache
+        self.version = None
+    
+    def load_model(self):
+        """Load the generative model or remote client on first use; returns True if it is available
+
+        Other threads wait for a load in progress instead of seeing a half-prepared model.
+        """
+        if not self.model_attempted:
+            with self.model_lock:
+                if not self.model_attempted:
+                    with METRICS.timer("model_load"):
+                        if self.backend == "openai":
+                            self.setup_client()
+                        else:
+                            self.setup_model()
+                    METRICS.inc("model_load" if self.model_available() else "model_load_failure")
+                    self.model_attempted = True
+        return self.model_available()
+    
+    def model_available(self):
+        if self.backend == "openai":
+            return self.client is not None
+        return self.model is not None and self.tokenizer is not None
+    
+    def setup_client(self):
+        """Create the OpenAI-compatible client, configured from the environment"""
+        if self.client is not None:
+            return
+        try:
+            from dream_openai import OpenAICompatibleClient
+            
+            client = OpenAICompatibleClient.from_env(max_tokens=self.max_new_tokens,
+                                                     timeout=self.latency_budget)
+            client.start()
+            self.client = client
+        except Exception as e:
+            self.client = None
+            self.load_error = str(e)
+            logger.warning("OpenAI-compatible backend unavailable, using rules: %s", e)
     
     def setup_model(self):
         """Initialize the GPT-2 model for dream interpretation"""
         try:
-            model_name = "gpt2-medium"
-            self.tokenizer = GPT2Tokenizer.from_pretrained(model_name)
-            self.model = GPT2LMHeadModel.from_pretrained(model_name)
+            from transformers import GPT2LMHeadModel, GPT2Tokenizer
+            
+            model_name = self.model_name
+            tokenizer = GPT2Tokenizer.from_pretrained(model_name)
+            if self.share_weights:
+                # Weights stay in the page cache, shared with other processes
+                from dream_weights import load_shared_model
+                model = load_shared_model(model_name)
+            else:
+                model = GPT2LMHeadModel.from_pretrained(model_name)
             
             # Add padding token
-            if self.tokenizer.pad_token is None:
-                self.tokenizer.pad_token = self.tokenizer.eos_token
+            if tokenizer.pad_token is None:
+                tokenizer.pad_token = tokenizer.eos_token
+            # Pad on the left so batched prompts end where generation starts
+            tokenizer.padding_side = "left"
+            
+            # Published only once fully prepared
+            self.model = self.optimize_model_for_cpu(model)
+            self.tokenizer = tokenizer
                 
         except Exception as e:
-            st.error(f"Error loading model: {str(e)}")
-            st.info("Using fallback interpretation system")
+            # Also runs headless (API, batch workers), so the UI reports load_error itself
+            self.tokenizer = None
+            self.model = None
+            self.load_error = str(e)
+            logger.warning("Error loading model %s, using rules: %s", self.model_name, e)
+    
+    def optimize_model_for_cpu(self, model):
+        """Prepare a loaded model for CPU-only inference; returns the model to use"""
+        import torch
+        
+        if self.num_threads:
+            torch.set_num_threads(self.num_threads)
+        
+        model.eval()
+        
+        # Quantizing copies every weight into private memory, which would undo sharing
+        if self.quantize and not self.share_weights:
+            # GPT-2 uses Conv1D for its projections, which dynamic quantization
+            # skips, so swap them for equivalent nn.Linear layers first
+            convert_conv1d_to_linear(model)
+            model = torch.quantization.quantize_dynamic(
+                model, {torch.nn.Linear}, dtype=torch.qint8
+            )
+        return model
+    
+    def build_prompt(self, dream_text, emotion, context, symbols):
+        """Build the generation prompt for the language model"""
+        return self.describe_dream(dream_text, emotion, context, symbols) + "Psychological interpretation: This dream"
+    
+    def build_messages(self, dream_text, emotion, context, symbols):
+        """Build the chat messages for an OpenAI-compatible endpoint"""
+        from dream_openai import SYSTEM_PROMPT
+        
+        return [
+            {"role": "system", "content": SYSTEM_PROMPT},
+            {"role": "user", "content": self.describe_dream(dream_text, emotion, context, symbols).strip()},
+        ]
+    
+    def describe_dream(self, dream_text, emotion, context, symbols):
+        """The dream, feeling, context and symbols, one per line"""
+        prompt = f"Dream: {dream_text.strip()}\nFeeling during the dream: {emotion}\n"
+        if context:
+            prompt += f"Life context: {context.strip()}\n"
+        if symbols:
+            prompt += "Symbols: " + ", ".join(symbol for symbol, _ in symbols) + "\n"
+        return prompt
+    
+    def generate_model_interpretation(self, dream_text, emotion, context, symbols):
+        """Generate an interpretation with the language model within the latency budget
+
+        Returns None if the budget was exhausted or nothing usable was generated.
+        """
+        return self.generate_model_interpretations([(dream_text, emotion, context, symbols)])[0]
+    
+    def generate_model_interpretations(self, requests):
+        """Generate interpretations for a batch of (dream_text, emotion, context, symbols)
+
+        The prompts are tokenized and run through the model together. Entries are
+        None where nothing usable was generated, or all of them if the batch ran
+        past the latency budget.
+        """
+        with METRICS.timer("model_generate"):
+            interpretations = self.run_model_generation(requests)
+        METRICS.inc("model_fallback", interpretations.count(None))
+        return interpretations
+    
+    def run_model_generation(self, requests):
+        """Run one batch of prompts through the model"""
+        if self.backend == "openai":
+            return self.run_remote_generation(requests)
+        
+        import torch
+        
+        start = time.perf_counter()
+        prompts = [self.build_prompt(*request) for request in requests]
+        
+        # Leave room in the context window for the generated tokens
+        max_prompt_tokens = self.model.config.n_positions - self.max_new_tokens
+        inputs = self.tokenizer(prompts, return_tensors="pt", padding=True, truncation=True,
+                                max_length=max_prompt_tokens)
+        
+        with torch.inference_mode():
+            output = self.model.generate(
+                **inputs,
+                max_new_tokens=self.max_new_tokens,
+                max_time=self.latency_budget,
+                use_cache=True,
+                do_sample=True,
+                temperature=0.8,
+                top_p=0.9,
+                pad_token_id=self.tokenizer.pad_token_id,
+            )
+        
+        if time.perf_counter() - start >= self.latency_budget:
+            return [None] * len(requests)
+        
+        # Prompts are left padded, so generated tokens start at the same offset
+        prompt_length = inputs["input_ids"].shape[1]
+        interpretations = []
+        for sequence in output:
+            generated = self.tokenizer.decode(sequence[prompt_length:], skip_special_tokens=True)
+            interpretations.append(self.clean_interpretation("This dream" + generated) if generated.strip() else None)
+        
+        return interpretations
+    
+    def run_remote_generation(self, requests):
+        """Send a batch of prompts to the OpenAI-compatible endpoint, concurrently"""
+        conversations = [self.build_messages(*request) for request in requests]
+        texts = self.client.complete_many(conversations, self.latency_budget)
+        return [self.clean_interpretation(text) if text else None for text in texts]
+    
+    def extract_features(self, dream_text):
+        """Tokenize the dream once and collect the features shared by all analyzers"""
+        with METRICS.timer("identify_symbols"):
+            return DreamFeatures(dream_text, self.matcher)
     
     def identify_symbols(self, dream_text):
         """Identify dream symbols in the text"""
-        found_symbols = []
-        dream_lower = dream_text.lower()
+        with METRICS.timer("identify_symbols"):
+            return self.matcher.identify(dream_text)
+    
+    def generate_interpretation(self, dream_text, emotion, context, symbols, features=None):
+        """Generate dream interpretation using the configured backend, through the cache if any"""
+        if self.cache is None:
+            return self.run_backend(dream_text, emotion, context, symbols, features)
         
-        for symbol, meaning in DREAM_SYMBOLS.items():
-            if symbol in dream_lower:
-                found_symbols.append((symbol, meaning))
+        key = self.cache.make_key(dream_text, emotion, context, self.cache_version())
+        interpretation = self.cache.get(key)
+        if interpretation is None:
+            interpretation = self.run_backend(dream_text, emotion, context, symbols, features)
+            self.cache.put(key, interpretation)
+        return interpretation
+    
+    def cache_version(self):
+        """Short digest of the backend, model, lexicon and rules, part of every cache key
+
+        Cached interpretations survive restarts on disk, so editing the lexicon or
+        rules, or switching models, must not keep serving the old ones.
+        """
+        if self.version is None:
+            if self.backend == "openai" and self.client is not None:
+                model = (self.client.base_url, self.client.model)
+            elif self.backend == "openai":
+                from dream_openai import DEFAULT_MODEL
+                model = (os.environ.get("OPENAI_BASE_URL"), os.environ.get("DREAM_OPENAI_MODEL", DEFAULT_MODEL))
+            else:
+                model = self.model_name if self.backend == "gpt2" else None
+            
+            fingerprint = getattr(self.symbols, "fingerprint", None)
+            if fingerprint is not None:
+                symbols = fingerprint()
+            else:
+                symbols = hashlib.sha256(json.dumps(sorted(self.symbols.items())).encode("utf-8")).hexdigest()
+            
+            version = json.dumps([self.backend, model, symbols, getattr(self.rules, "fingerprint", None)], default=str)
+            self.version = hashlib.sha256(version.encode("utf-8")).hexdigest()[:16]
+        return self.version
+    
+    def run_backend(self, dream_text, emotion, context, symbols, features=None):
+        """Generate dream interpretation using the configured backend"""
+        
+        if self.backend != "rules" and self.load_model():
+            try:
+                interpretation = self.generate_model_interpretation(dream_text, emotion, context, symbols)
+                if interpretation:
+                    return interpretation
+            except Exception:
+                pass
         
-        return found_symbols
+        # Rule-based interpretation, also used when generation is too slow or fails
+        return self.create_comprehensive_interpretation(dream_text, emotion, context, symbols, features)
     
-    def generate_interpretation(self, dream_text, emotion, context, symbols):
-        """Generate dream interpretation using rule-based approach and templates"""
+    def generate_interpretations(self, requests):
+        """Generate interpretations for a batch of (dream_text, emotion, context, symbols, features)"""
+        interpretations = [None] * len(requests)
+        keys = [None] * len(requests)
         
-        # Use rule-based interpretation for better accuracy
-        return self.create_comprehensive_interpretation(dream_text, emotion, context, symbols)
+        if self.cache is not None:
+            for i, (dream_text, emotion, context, _, _) in enumerate(requests):
+                keys[i] = self.cache.make_key(dream_text, emotion, context, self.cache_version())
+                interpretations[i] = self.cache.get(keys[i])
+        
+        # Only the cache misses go through the backend
+        pending = [i for i, interpretation in enumerate(interpretations) if interpretation is None]
+        generated = [None] * len(pending)
+        
+        if pending and self.backend != "rules" and self.load_model():
+            try:
+                generated = self.generate_model_interpretations(
+                    [requests[i][:4] for i in pending]
+                )
+            except Exception:
+                pass
+        
+        # Fall back to the rule-based interpretation wherever generation gave nothing
+        for i, interpretation in zip(pending, generated):
+            interpretations[i] = interpretation or self.create_comprehensive_interpretation(*requests[i])
+            if self.cache is not None:
+                self.cache.put(keys[i], interpretations[i])
+        
+        return interpretations
     
     def clean_interpretation(self, text):
         """Clean and format the AI-generated interpretation"""
@@ -96,108 +462,215 @@ class DreamInterpreter:
         
         return '. '.join(cleaned_sentences[:3]) + '.' if cleaned_sentences else text[:200] + '...'
     
-    def create_comprehensive_interpretation(self, dream_text, emotion, context, symbols):
+    def create_comprehensive_interpretation(self, dream_text, emotion, context, symbols, features=None):
         """Create a comprehensive interpretation using psychological frameworks"""
         
+        # Combine all parts
+        full_interpretation = " ".join(self.interpretation_parts(dream_text, emotion, context, symbols, features))
+        
+        return full_interpretation
+    
+    def interpretation_parts(self, dream_text, emotion, context, symbols, features=None):
+        """Yield the rule-based interpretation one analysis stage at a time"""
+        
         # Analyze dream elements
-        dream_lower = dream_text.lower()
-        interpretation_parts = []
+        if features is None:
+            features = self.extract_features(dream_text)
         
         # Core dream analysis
-        interpretation_parts.append(self.analyze_core_narrative(dream_text, emotion, context))
+        with METRICS.timer("analyze_core_narrative"):
+            part = self.analyze_core_narrative(features, emotion, context)
+        yield part
         
         # Symbol analysis
         if symbols:
-            interpretation_parts.append(self.analyze_symbols_in_context(symbols, dream_text, emotion))
+            with METRICS.timer("analyze_symbols_in_context"):
+                part = self.analyze_symbols_in_context(symbols, features, emotion)
+            yield part
         
         # Emotional and contextual analysis
-        interpretation_parts.append(self.analyze_emotional_context(emotion, context, dream_text))
+        with METRICS.timer("analyze_emotional_context"):
+            part = self.analyze_emotional_context(emotion, context, features)
+        yield part
+    
+    def stream_interpretation(self, dream_text, emotion, context, symbols, features=None):
+        """Yield the interpretation in fragments as they become available
+
+        For the rule-based backend the fragments join up to exactly the text of
+        generate_interpretation. With a model backend, generated text is yielded
+        one cleaned sentence at a time, falling back to the rule-based stages if
+        nothing usable arrives within the latency budget. Cached interpretations
+        are yielded whole; model text that was cut off is not cached.
+        """
+        if self.cache is None:
+            yield from self.stream_backend(dream_text, emotion, context, symbols, features)
+            return
         
-        # Combine all parts
-        full_interpretation = " ".join(interpretation_parts)
+        key = self.cache.make_key(dream_text, emotion, context, self.cache_version())
+        interpretation = self.cache.get(key)
+        if interpretation is not None:
+            yield interpretation
+            return
         
-        return full_interpretation
+        fragments = []
+        stream = self.stream_backend(dream_text, emotion, context, symbols, features)
+        while True:
+            try:
+                fragment = next(stream)
+            except StopIteration as stop:
+                complete = stop.value
+                break
+            fragments.append(fragment)
+            yield fragment
+        if complete:
+            self.cache.put(key, "".join(fragments))
     
-    def analyze_core_narrative(self, dream_text, emotion, context):
-        """Analyze the core narrative structure of the dream"""
-        dream_lower = dream_text.lower()
+    def acquire_stream(self):
+        """Reserve a stream; False when max_streams model streams are already running
+
+        Callers that get False should use InterpretationScheduler instead, which
+        batches their requests. Rule-based streams are cheap and always allowed.
+        """
+        return self.backend == "rules" or self.stream_slots.acquire(blocking=False)
+    
+    def release_stream(self):
+        if self.backend != "rules":
+            self.stream_slots.release()
+    
+    def stream_backend(self, dream_text, emotion, context, symbols, features=None):
+        """Yield interpretation fragments from the configured backend
+
+        Returns False when the fragments should not be cached: the model failed
+        or ran past the latency budget after some of its text had been yielded.
+        """
+        if self.backend != "rules" and self.load_model():
+            shown = False
+            start = time.perf_counter()
+            try:
+                for fragment in self.stream_model_interpretation(dream_text, emotion, context, symbols):
+                    shown = True
+                    yield fragment
+                complete = time.perf_counter() - start < self.latency_budget
+            except Exception:
+                complete = False
+            if shown:
+                return complete
+            METRICS.inc("model_fallback")
         
-        # Identify key dream patterns
-        if "chasing" in dream_lower or "chase" in dream_lower:
-            if "dog" in dream_lower:
-                return "Being chased by a dog in dreams often represents loyalty conflicts or feeling pursued by responsibilities you're trying to avoid. The circular nature of returning to where you started suggests you may feel trapped in a recurring situation."
-            else:
-                return "Being chased in dreams typically represents avoidance of something in waking life that requires your attention."
+        for i, part in enumerate(self.interpretation_parts(dream_text, emotion, context, symbols, features)):
+            yield part if i == 0 else " " + part
+        return True
+    
+    def stream_model_interpretation(self, dream_text, emotion, context, symbols):
+        """Yield model-generated text as it is decoded, within the latency budget
+
+        Sentences are yielded as they complete and pass the same filter as
+        clean_interpretation, so the fragments join up to the cleaned text.
+        """
+        if self.backend == "openai":
+            # The endpoint is asked for whole completions; yield each one at once
+            interpretation = self.generate_model_interpretation(dream_text, emotion, context, symbols)
+            if interpretation:
+                yield interpretation
+            return
         
-        elif "flying" in dream_lower:
-            if "falling" in dream_lower:
-                return "The transition from flying to falling suggests a loss of control or confidence. Flying represents freedom and transcendence, while falling indicates anxiety about losing that control."
-            else:
-                return "Flying in dreams often symbolizes liberation, rising above current challenges, or a desire for freedom from constraints."
+        import torch
+        from transformers import StoppingCriteria, StoppingCriteriaList, TextIteratorStreamer
         
-        elif "water" in dream_lower:
-            if "drowning" in dream_lower or "deep" in dream_lower:
-                return "Deep water or drowning scenarios often represent feeling overwhelmed by emotions or situations in your life."
-            else:
-                return "Water in dreams typically represents emotions, the subconscious mind, or life transitions."
+        start = time.perf_counter()
+        prompt = self.build_prompt(dream_text, emotion, context, symbols)
+        max_prompt_tokens = self.model.config.n_positions - self.max_new_tokens
+        inputs = self.tokenizer(prompt, return_tensors="pt", truncation=True, max_length=max_prompt_tokens)
         
-        elif "house" in dream_lower or "home" in dream_lower:
-            return "Houses in dreams often represent different aspects of your psyche or your current life situation."
+        # The streamer raises queue.Empty if no text arrives within the budget
+        streamer = TextIteratorStreamer(self.tokenizer, skip_prompt=True, skip_special_tokens=True,
+                                        timeout=self.latency_budget)
+        stop = threading.Event()
+        failed = threading.Event()
         
-        elif "death" in dream_lower or "dying" in dream_lower:
-            return "Death in dreams rarely represents literal death, but rather transformation, the end of one phase, and the beginning of another."
+        class StopRequested(StoppingCriteria):
+            def __call__(self, input_ids, scores, **kwargs):
+                return stop.is_set()
         
-        else:
-            return "Your dream reflects current psychological processes and concerns in your waking life."
+        def generate():
+            try:
+                with torch.inference_mode():
+                    self.model.generate(
+                        **inputs,
+                        streamer=streamer,
+                        stopping_criteria=StoppingCriteriaList([StopRequested()]),
+                        max_new_tokens=self.max_new_tokens,
+                        max_time=self.latency_budget,
+                        use_cache=True,
+                        do_sample=True,
+                        temperature=0.8,
+                        top_p=0.9,
+                        pad_token_id=self.tokenizer.pad_token_id,
+                    )
+            except Exception:
+                failed.set()
+                streamer.end()
+        
+        # Not a daemon: generation is bounded by max_time and must not be killed mid-call
+        threading.Thread(target=generate).start()
+        
+        generated = ""
+        pending = "This dream"
+        sentences = 0
+        try:
+            for text in streamer:
+                generated += text
+                *finished, pending = (pending + text).split(".")
+                for sentence in finished:
+                    sentence = sentence.strip()
+                    if len(sentence) > 10 and sentence[0].isupper():
+                        yield (" " if sentences else "") + sentence + "."
+                        sentences += 1
+                        if sentences == 3:
+                            return
+            if failed.is_set():
+                raise RuntimeError("Generation failed")
+            
+            # Text cut off by the budget is dropped, as in run_model_generation
+            if time.perf_counter() - start >= self.latency_budget:
+                return
+            pending = pending.strip()
+            if len(pending) > 10 and pending[0].isupper():
+                yield (" " if sentences else "") + pending + "."
+            elif not sentences and generated.strip():
+                yield self.clean_interpretation("This dream" + generated)
+        finally:
+            # Stop generating once the caller has what it needs, or has gone away
+            stop.set()
+    
+    def analyze_core_narrative(self, features, emotion, context):
+        """Analyze the core narrative structure of the dream"""
+        facts = self.rules.facts(features, emotion, context)
+        return self.rules.first("narrative", facts) or ""
     
-    def analyze_symbols_in_context(self, symbols, dream_text, emotion):
+    def analyze_symbols_in_context(self, symbols, features, emotion):
         """Analyze symbols within the context of the specific dream"""
-        dream_lower = dream_text.lower()
+        facts = self.rules.facts(features, emotion, None)
         analysis = []
         
         for symbol, base_meaning in symbols:
-            if symbol == "chase" and "dog" in dream_lower:
-                analysis.append("The dog chasing you may represent loyalty, protection, or instinctual drives that you're running from.")
-            elif symbol == "chase":
-                analysis.append("The chase element suggests you're avoiding confronting something important in your life.")
-            elif symbol == "water" and ("deep" in dream_lower or "ocean" in dream_lower):
-                analysis.append("The deep water represents the depth of emotions or subconscious material you're dealing with.")
-            elif symbol == "flying" and emotion == "Happy":
-                analysis.append("Flying while feeling happy suggests you're experiencing or seeking greater freedom in your life.")
-            else:
-                analysis.append(f"The {symbol} in your dream suggests {base_meaning}.")
+            text = self.rules.first("symbol", facts, symbol, base_meaning)
+            if text:
+                analysis.append(text)
         
         return " ".join(analysis) if analysis else ""
     
-    def analyze_emotional_context(self, emotion, context, dream_text):
+    def analyze_emotional_context(self, emotion, context, features):
         """Analyze the emotional and life context"""
-        dream_lower = dream_text.lower()
+        facts = self.rules.facts(features, emotion, context)
         
-        # Context-specific analysis
-        context_analysis = ""
-        if context:
-            context_lower = context.lower()
-            if "stress" in context_lower or "exam" in context_lower:
-                context_analysis = "Given your current exam stress, this dream likely reflects your anxiety about performance and the feeling of being pursued by academic pressures."
-            elif "work" in context_lower:
-                context_analysis = "Your work-related stress appears to be manifesting in your dreams as scenarios of pursuit or challenge."
-            elif "relationship" in context_lower:
-                context_analysis = "The relationship dynamics in your life may be influencing the interpersonal elements in your dream."
-        
-        # Emotion-specific analysis
-        emotion_analysis = ""
-        if emotion == "Confused":
-            emotion_analysis = "Your confusion in the dream mirrors feelings of uncertainty or lack of clarity in your waking life."
-        elif emotion == "Anxious":
-            emotion_analysis = "The anxiety you felt reflects current worries or concerns that may need attention."
-        elif emotion == "Scared":
-            emotion_analysis = "The fear in your dream suggests you may be confronting something that feels threatening or overwhelming."
-        elif emotion == "Happy":
-            emotion_analysis = "The positive emotions indicate healthy psychological processing and optimism."
-        
-        # Special case for circular/repetitive dreams
-        if "back" in dream_lower and ("where" in dream_lower or "started" in dream_lower):
-            emotion_analysis += " The circular nature of returning to where you started suggests feelings of being stuck or trapped in repetitive patterns."
+        # Context-specific and emotion-specific analysis
+        context_analysis = self.rules.first("context", facts) or ""
+        emotion_analysis = self.rules.first("emotion", facts) or ""
+        
+        # Patterns such as circular/repetitive dreams add to the emotional analysis
+        for text in self.rules.all("pattern", facts):
+            emotion_analysis += " " + text
         
         return f"{context_analysis} {emotion_analysis}".strip()
     
@@ -205,10 +678,216 @@ class DreamInterpreter:
         """Create interpretation when AI model fails - now more sophisticated"""
         return self.create_comprehensive_interpretation(dream_text, emotion, context, symbols)
 
-def create_dream_journal_entry(dream_text, emotion, context, interpretation, symbols):
+class InterpretationScheduler:
+    """Queue interpretation jobs from many sessions and run them in micro-batches
+
+    A single worker thread owns the interpreter. It takes the first queued job,
+    keeps collecting jobs until max_batch_size is reached or max_wait seconds
+    have passed, then interprets the whole batch at once and resolves each
+    job's future with its own result.
+    """
+
+    def __init__(self, interpreter, max_batch_size=8, max_wait=0.05):
+        self.interpreter = interpreter
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.jobs = queue.Queue()
+        self.worker = threading.Thread(target=self.run, name="interpretation-scheduler", daemon=True)
+        self.worker.start()
+
+    def submit(self, dream_text, emotion, context, symbols=None, features=None):
+        """Queue an interpretation job; returns a Future resolving to the interpretation"""
+        if features is None:
+            features = self.interpreter.extract_features(dream_text)
+        if symbols is None:
+            symbols = features.symbols
+        future = Future()
+        self.jobs.put(((dream_text, emotion, context, symbols, features), future))
+        return future
+
+    def interpret(self, dream_text, emotion, context, symbols=None, features=None, timeout=None):
+        """Queue an interpretation job and wait for its result"""
+        return self.submit(dream_text, emotion, context, symbols, features).result(timeout)
+
+    def next_batch(self):
+        """Block for the first job, then gather more until the batch is full or the wait runs out"""
+        batch = [self.jobs.get()]
+        deadline = time.monotonic() + self.max_wait
+        
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                batch.append(self.jobs.get(timeout=remaining) if remaining > 0 else self.jobs.get_nowait())
+            except queue.Empty:
+                break
+        
+        return batch
+
+    def run(self):
+        """Worker loop: interpret batches and hand each result back to its caller"""
+        while True:
+            batch = self.next_batch()
+            # Skip jobs whose callers gave up before the batch started
+            batch = [(request, future) for request, future in batch if future.set_running_or_notify_cancel()]
+            if not batch:
+                continue
+            
+            try:
+                interpretations = self.interpreter.generate_interpretations([request for request, _ in batch])
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            
+            for (_, future), interpretation in zip(batch, interpretations):
+                future.set_result(interpretation)
+
+
+class InterpretationCache:
+    """Bounded LRU/TTL cache of interpretations with an optional SQLite tier on disk
+
+    Keys are built from the normalized dream text, emotion and context and the
+    interpreter's cache_version, which covers its backend, model, lexicon and rules.
+    The in-memory tier holds at most max_size entries; with a path, entries are
+    also written to a SQLite file so they survive restarts. Entries older than
+    ttl seconds are treated as missing.
+    """
+
+    def __init__(self, max_size=1024, ttl=None, path=None, max_disk_size=100000):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.max_disk_size = max_disk_size
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        
+        self.db = None
+        if path:
+            self.db = sqlite3.connect(path, check_same_thread=False)
+            self.db.execute(
+                "CREATE TABLE IF NOT EXISTS interpretations "
+                "(key TEXT PRIMARY KEY, interpretation TEXT NOT NULL, created REAL NOT NULL)"
+            )
+            self.db.execute("CREATE INDEX IF NOT EXISTS interpretations_created ON interpretations (created)")
+            self.db.commit()
+            self.disk_size = self.db.execute("SELECT COUNT(*) FROM interpretations").fetchone()[0]
+
+    @staticmethod
+    def make_key(dream_text, emotion, context, version):
+        """Build a cache key from the normalized request and the interpreter's cache version"""
+        normalized = (
+            " ".join(dream_text.lower().split()),
+            emotion,
+            " ".join((context or "").lower().split()),
+            version,
+        )
+        return hashlib.sha256(json.dumps(normalized).encode("utf-8")).hexdigest()
+
+    def expired(self, created):
+        return self.ttl is not None and time.time() - created > self.ttl
+
+    def get(self, key):
+        """Return the cached interpretation, or None on a miss"""
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                interpretation, created = entry
+                if not self.expired(created):
+                    self.entries.move_to_end(key)
+                    self.hits += 1
+                    METRICS.inc("cache_hit")
+                    return interpretation
+                del self.entries[key]
+                self.evictions += 1
+                METRICS.inc("cache_eviction")
+            
+            if self.db is not None:
+                row = self.db.execute(
+                    "SELECT interpretation, created FROM interpretations WHERE key = ?", (key,)
+                ).fetchone()
+                if row is not None and not self.expired(row[1]):
+                    self.store(key, row[0], row[1])
+                    self.disk_hits += 1
+                    METRICS.inc("cache_disk_hit")
+                    return row[0]
+            
+            self.misses += 1
+            METRICS.inc("cache_miss")
+            return None
+
+    def put(self, key, interpretation):
+        """Cache an interpretation in memory and, if configured, on disk"""
+        created = time.time()
+        with self.lock:
+            self.store(key, interpretation, created)
+            if self.db is not None:
+                inserted = self.db.execute(
+                    "INSERT OR REPLACE INTO interpretations (key, interpretation, created) VALUES (?, ?, ?)",
+                    (key, interpretation, created),
+                ).rowcount
+                self.disk_size += inserted
+                if self.disk_size > self.max_disk_size:
+                    self.prune_disk()
+                self.db.commit()
+
+    def store(self, key, interpretation, created):
+        """Insert into the memory tier, evicting the least recently used entries"""
+        self.entries[key] = (interpretation, created)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+            METRICS.inc("cache_eviction")
+
+    def prune_disk(self):
+        """Drop the oldest on-disk entries beyond max_disk_size, and expired ones"""
+        if self.ttl is not None:
+            self.db.execute("DELETE FROM interpretations WHERE created < ?", (time.time() - self.ttl,))
+        self.db.execute(
+            "DELETE FROM interpretations WHERE key IN "
+            "(SELECT key FROM interpretations ORDER BY created DESC LIMIT -1 OFFSET ?)",
+            (self.max_disk_size,),
+        )
+        self.disk_size = self.db.execute("SELECT COUNT(*) FROM interpretations").fetchone()[0]
+
+    def stats(self):
+        """Return hit, miss and eviction counters"""
+        with self.lock:
+            lookups = self.hits + self.disk_hits + self.misses
+            return {
+                "size": len(self.entries),
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": (self.hits + self.disk_hits) / lookups if lookups else 0.0,
+            }
+
+
+def convert_conv1d_to_linear(module):
+    """Replace transformers Conv1D layers with equivalent nn.Linear layers in place"""
+    import torch
+    from transformers.pytorch_utils import Conv1D
+    
+    for name, child in module.named_children():
+        if isinstance(child, Conv1D):
+            in_features, out_features = child.weight.shape
+            linear = torch.nn.Linear(in_features, out_features)
+            # Conv1D stores its weight transposed relative to nn.Linear
+            linear.weight.data = child.weight.data.t().contiguous()
+            linear.bias.data = child.bias.data
+            setattr(module, name, linear)
+        else:
+            convert_conv1d_to_linear(child)
+
+
+def create_dream_journal_entry(dream_text, emotion, context, interpretation, symbols, date=None):
     """Create a journal entry for the dream"""
     entry = {
-        "date": datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        "date": date or datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
         "dream": dream_text,
         "emotion": emotion,
         "context": context,
@@ -217,63 +896,249 @@ def create_dream_journal_entry(dream_text, emotion, context, interpretation, sym
     }
     return entry
 
+
+# Interpreter owned by each batch worker process, created by init_batch_worker
+batch_interpreter = None
+
+
+def model_options():
+    """Model arguments for DreamInterpreter from DREAM_MODEL, DREAM_NUM_THREADS and DREAM_SHARED_WEIGHTS"""
+    return {
+        "model_name": os.environ.get("DREAM_MODEL", "gpt2-medium"),
+        "num_threads": int(os.environ.get("DREAM_NUM_THREADS", "0")) or None,
+        "share_weights": os.environ.get("DREAM_SHARED_WEIGHTS") == "1",
+    }
+
+
+def init_batch_worker(backend):
+    global batch_interpreter
+    batch_interpreter = DreamInterpreter(backend=backend, **model_options())
+
+
+def parse_batch_record(line):
+    """Parse one JSONL record into (dream, emotion, context, date); raises ValueError if invalid"""
+    try:
+        record = json.loads(line)
+        # Accept both raw requests and exported journal entries
+        dream_text = record.get("dream") or record["dream_text"]
+        emotion = record.get("emotion", "Other")
+        context = record.get("context") or ""
+        date = record.get("date")
+    except (KeyError, TypeError, AttributeError) as e:
+        raise ValueError(f"Invalid record: {e}")
+    
+    if not isinstance(dream_text, str) or not dream_text.strip():
+        raise ValueError("dream must be a non-empty string")
+    if not isinstance(emotion, str) or not isinstance(context, str):
+        raise ValueError("emotion and context must be strings")
+    if date is not None and not isinstance(date, str):
+        raise ValueError("date must be a string")
+    return dream_text, emotion, context, date
+
+
+def interpret_batch_lines(lines):
+    """Interpret a chunk of JSONL records in a worker; returns (output lines, error count)"""
+    output = []
+    errors = 0
+    
+    for line in lines:
+        try:
+            dream_text, emotion, context, date = parse_batch_record(line)
+        except ValueError:
+            errors += 1
+            continue
+        
+        # One record that fails to interpret must not lose the rest of the chunk
+        try:
+            features = batch_interpreter.extract_features(dream_text)
+            interpretation = batch_interpreter.generate_interpretation(
+                dream_text, emotion, context, features.symbols, features
+            )
+            entry = create_dream_journal_entry(
+                dream_text, emotion, context, interpretation, features.symbols, date
+            )
+        except Exception:
+            errors += 1
+            continue
+        output.append(json.dumps(entry, ensure_ascii=False))
+    
+    return output, errors
+
+
+def read_chunks(lines, chunk_size):
+    """Group non-blank lines into lists of chunk_size, lazily"""
+    chunk = []
+    for line in lines:
+        if line.strip():
+            chunk.append(line)
+            if len(chunk) == chunk_size:
+                yield chunk
+                chunk = []
+    if chunk:
+        yield chunk
+
+
+def run_batch(input_file, output_file, workers=None, backend="rules", chunk_size=256):
+    """Interpret every JSONL record of input_file into output_file
+
+    Records are read lazily in chunks, interpreted across a process pool and
+    written as soon as each chunk finishes, so output order follows completion
+    order. At most two chunks per worker are in flight, which keeps memory
+    constant regardless of the input size. Returns (written, errors).
+    """
+    from concurrent.futures import ALL_COMPLETED, FIRST_COMPLETED, ProcessPoolExecutor, wait
+    
+    workers = workers or os.cpu_count() or 1
+    max_in_flight = workers * 2
+    written = errors = 0
+    
+    with ProcessPoolExecutor(workers, initializer=init_batch_worker, initargs=(backend,)) as pool:
+        in_flight = set()
+        
+        def drain(return_when):
+            nonlocal in_flight, written, errors
+            done, in_flight = wait(in_flight, return_when=return_when)
+            for future in done:
+                lines, chunk_errors = future.result()
+                for line in lines:
+                    output_file.write(line + "\n")
+                written += len(lines)
+                errors += chunk_errors
+        
+        for chunk in read_chunks(input_file, chunk_size):
+            in_flight.add(pool.submit(interpret_batch_lines, chunk))
+            if len(in_flight) >= max_in_flight:
+                drain(FIRST_COMPLETED)
+        
+        if in_flight:
+            drain(ALL_COMPLETED)
+    
+    return written, errors
+
+
+def batch_main(argv=None):
+    """Command line entry point: python -m dream_interpreter batch in.jsonl out.jsonl"""
+    import argparse
+    import sys
+    
+    parser = argparse.ArgumentParser(prog="python -m dream_interpreter batch",
+                                     description="Interpret a JSONL file of dreams into journal entries")
+    parser.add_argument("input", help="JSONL input with dream (or dream_text), emotion and context fields; - for stdin")
+    parser.add_argument("output", help="JSONL output of journal entries; - for stdout")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: CPU count)")
+    parser.add_argument("--backend", choices=BACKENDS, default="rules")
+    parser.add_argument("--chunk-size", type=int, default=256, help="records per worker task")
+    parser.add_argument("--share-weights", action="store_true",
+                        help="memory-map the model checkpoint so workers share one copy of the weights")
+    parser.add_argument("--strict", action="store_true",
+                        help="exit with status 1 if any record was skipped")
+    args = parser.parse_args(argv)
+    
+    if args.share_weights:
+        # Read by every worker process as it starts
+        os.environ["DREAM_SHARED_WEIGHTS"] = "1"
+    
+    input_file = sys.stdin if args.input == "-" else open(args.input, encoding="utf-8")
+    output_file = sys.stdout if args.output == "-" else open(args.output, "w", encoding="utf-8")
+    
+    try:
+        started = time.perf_counter()
+        written, errors = run_batch(input_file, output_file, args.workers, args.backend, args.chunk_size)
+    finally:
+        if input_file is not sys.stdin:
+            input_file.close()
+        if output_file is not sys.stdout:
+            output_file.close()
+    
+    elapsed = time.perf_counter() - started
+    print(f"Interpreted {written} dreams in {elapsed:.1f}s ({errors} invalid or failed records skipped)", file=sys.stderr)
+    # Skipped records are reported above; a partial run only fails when asked to
+    return 1 if errors and args.strict else 0
+
 def main():
+    import streamlit as st
+    
     st.set_page_config(
         page_title="AI Dream Interpreter",
         page_icon="🌙",
         layout="wide"
     )
     
-    # Custom CSS for better styling
-    st.markdown("""
-<style>
-.main-header {
-    text-align: center;
-    color: #2C3E50;
-    font-size: 3rem;
-    margin-bottom: 2rem;
-}
-.dream-box {
-    background-color: #fdfdfd;
-    color: #1C1C1C;
-    padding: 20px;
-    border-radius: 10px;
-    margin: 10px 0;
-}
-.interpretation-box {
-    background-color: #eef6fc;
-    color: #1C1C1C;
-    padding: 20px;
-    border-radius: 10px;
-    border-left: 4px solid #3498DB;
-}
-.symbol-box {
-    background-color: #fff8e1;
-    color: #1C1C1C;
-    padding: 15px;
-    border-radius: 8px;
-    margin: 5px 0;
-    border-left: 4px solid #f1c40f;
-}
-</style>
-""", unsafe_allow_html=True)
-
-    
-    # Header
-    st.markdown('<h1 class="main-header">🌙 AI Dream Interpreter</h1>', unsafe_allow_html=True)
-    st.markdown("### *Unlock the mysteries of your dreams with AI-powered interpretation*")
+    import dream_render as render
+    
+    # Styles and header in one delta
+    st.markdown(render.HEADER, unsafe_allow_html=True)
     
     # Initialize the dream interpreter
     @st.cache_resource
-    def load_interpreter():
-        return DreamInterpreter()
+    def load_interpreter(backend):
+        cache = InterpretationCache(path=os.environ.get("DREAM_INTERPRETER_CACHE"))
+        return DreamInterpreter(backend=backend, cache=cache, **model_options())
+    
+    @st.cache_resource
+    def load_scheduler(backend):
+        # Rule-based jobs are cheap, so only batch what is already queued
+        return InterpretationScheduler(load_interpreter(backend), max_wait=0 if backend == "rules" else 0.05)
+    
+    @st.cache_resource
+    def load_journal():
+        return JournalStore(os.environ.get("DREAM_JOURNAL_DB", DEFAULT_JOURNAL_PATH))
     
-    interpreter = load_interpreter()
+    @st.cache_resource
+    def load_similarity_index():
+        from dream_similarity import DEFAULT_VECTORS_DIR, SimilarityIndex
+        return SimilarityIndex(os.environ.get("DREAM_VECTORS_DIR", DEFAULT_VECTORS_DIR))
+    
+    @st.cache_resource
+    def load_symbol_reference():
+        # Rendered once per process; the lexicon does not change while running
+        return render.symbol_reference_html(DREAM_SYMBOLS.groups())
+    
+    @st.cache_resource
+    def start_metrics_exporters():
+        # Once per process: a scrape file for a textfile collector and/or a /metrics endpoint
+        if os.environ.get("DREAM_METRICS_FILE"):
+            METRICS.start_scrape_file_writer(os.environ["DREAM_METRICS_FILE"])
+        if os.environ.get("DREAM_METRICS_PORT"):
+            METRICS.serve(int(os.environ["DREAM_METRICS_PORT"]), os.environ.get("DREAM_METRICS_HOST", "127.0.0.1"))
+        return True
+    
+    start_metrics_exporters()
+    backend = os.environ.get("DREAM_INTERPRETER_BACKEND", "rules")
+    interpreter = load_interpreter(backend)
+    scheduler = load_scheduler(backend)
+    journal = load_journal()
+    similarity_index = load_similarity_index()
+    
+    # Each browser session gets its own journal; the id is kept in the URL so it can be reopened
+    if 'journal_id' not in st.session_state:
+        query_params = st.experimental_get_query_params()
+        journal_id = query_params.get("journal", [""])[0]
+        # Ids also name files, so anything else in the URL starts a new journal
+        st.session_state.journal_id = journal_id if valid_journal_id(journal_id) else uuid.uuid4().hex
+        st.experimental_set_query_params(journal=st.session_state.journal_id)
+    journal_id = st.session_state.journal_id
     
     # Sidebar for navigation
     st.sidebar.title("🌟 Navigation")
     page = st.sidebar.selectbox("Choose a section:", 
-                               ["Dream Interpretation", "Dream Journal", "About Dream Symbols"])
+                               ["Dream Interpretation", "Dream Journal", "Dream Patterns", "About Dream Symbols"])
+    stream_results = st.sidebar.checkbox("⚡ Stream interpretation", value=True)
+    
+    # Pipeline timings for debugging, only when metrics are enabled
+    if METRICS.enabled and st.sidebar.checkbox("🛠️ Show pipeline metrics"):
+        stages, events = METRICS.snapshot()
+        st.sidebar.markdown("**Stage latency (ms)**")
+        st.sidebar.table({
+            "stage": list(stages),
+            "count": [m["count"] for m in stages.values()],
+            "mean": [round(m["mean_ms"], 2) for m in stages.values()],
+            "p95": [round(m["p95_ms"], 2) for m in stages.values()],
+            "max": [round(m["max_ms"], 2) for m in stages.values()],
+        })
+        if events:
+            st.sidebar.markdown("**Events**")
+            st.sidebar.table({"event": list(events), "count": list(events.values())})
     
     if page == "Dream Interpretation":
         st.markdown("---")
@@ -305,88 +1170,132 @@ def main():
             submitted = st.form_submit_button("🔮 Interpret My Dream", use_container_width=True)
         
         if submitted and dream_text:
-            with st.spinner("🌙 Analyzing your dream..."):
-                # Identify symbols
-                symbols = interpreter.identify_symbols(dream_text)
-                
-                # Generate interpretation
-                interpretation = interpreter.generate_interpretation(
-                    dream_text, emotion, context, symbols
-                )
+            with st.spinner("🌙 Analyzing your dream..."), METRICS.timer("request"):
+                # Extract features and symbols in a single pass
+                features = interpreter.extract_features(dream_text)
+                symbols = features.symbols
                 
                 # Display results
                 st.markdown("---")
                 st.header("🔮 Your Dream Interpretation")
                 
                 # Main interpretation
-                st.markdown(f'<div class="interpretation-box"><h4 style="color:black;">Psychological Analysis:</h4><p>{interpretation}</p></div>', unsafe_allow_html=True)
-
+                # Model streams are not batched, so past max_streams sessions wait for the scheduler instead
+                if stream_results and interpreter.acquire_stream():
+                    try:
+                        # Render each fragment as soon as it is ready
+                        interpretation_placeholder = st.empty()
+                        interpretation = ""
+                        for fragment in interpreter.stream_interpretation(dream_text, emotion, context, symbols, features):
+                            interpretation += fragment
+                            interpretation_placeholder.markdown(render.interpretation_html(interpretation), unsafe_allow_html=True)
+                    finally:
+                        interpreter.release_stream()
+                else:
+                    # Generate interpretation, batched with other sessions' requests
+                    interpretation = scheduler.interpret(dream_text, emotion, context, symbols, features)
+                    st.markdown(render.interpretation_html(interpretation), unsafe_allow_html=True)
                 
-                # Symbols section
-                if symbols:
-                    st.subheader("🎭 Symbols in Your Dream")
-                    for symbol, meaning in symbols:
-                        st.markdown(f'<div class="symbol-box"><strong>{symbol.title()}:</strong> {meaning}</div>', 
-                                   unsafe_allow_html=True)
-                
-                # Additional insights
-                st.subheader("💡 Additional Insights")
-                col1, col2 = st.columns(2)
-                
-                with col1:
-                    st.markdown("**Emotional Significance:**")
-                    if emotion == "Anxious":
-                        st.write("Your anxiety in the dream may reflect current worries or uncertainties.")
-                    elif emotion == "Happy":
-                        st.write("Positive emotions suggest harmony and contentment in your life.")
-                    elif emotion == "Scared":
-                        st.write("Fear in dreams often represents facing the unknown or personal challenges.")
-                    else:
-                        st.write("Your emotions in the dream provide clues about your current state of mind.")
+                if interpreter.load_error:
+                    st.error(f"Error loading model: {interpreter.load_error}")
+                    st.info("Using fallback interpretation system")
+
                 
-                with col2:
-                    st.markdown("**Recommendations:**")
-                    st.write("• Keep a dream journal to track patterns")
-                    st.write("• Reflect on how the dream relates to your current life")
-                    st.write("• Consider what changes the dream might be suggesting")
+                with METRICS.timer("render_results"):
+                    # Symbols section, all boxes in one delta however many symbols were found
+                    if symbols:
+                        st.subheader("🎭 Symbols in Your Dream")
+                        st.markdown(render.symbols_html(symbols), unsafe_allow_html=True)
                 
-                # Save to session state for journal
-                if 'dream_journal' not in st.session_state:
-                    st.session_state.dream_journal = []
+                    # Additional insights
+                    st.subheader("💡 Additional Insights")
+                    st.markdown(render.insights_html(emotion), unsafe_allow_html=True)
                 
+                # Save to the persistent journal
                 entry = create_dream_journal_entry(dream_text, emotion, context, interpretation, symbols)
-                st.session_state.dream_journal.append(entry)
+                with METRICS.timer("journal_append"):
+                    entry_id = journal.append(journal_id, entry)
                 
                 st.success("✅ Dream interpretation saved to your journal!")
+                
+                # Past dreams most like this one
+                with METRICS.timer("similar_dreams"):
+                    similar = similarity_index.similar(journal_id, journal, features, k=3, exclude={entry_id})
+                if similar:
+                    st.subheader("🔗 Dreams Like This One")
+                    for score, past in similar:
+                        with st.expander(f"Dream from {past['date']} - {past['emotion']} ({score:.0%} similar)"):
+                            st.markdown(render.entry_html(past, ("dream", "interpretation"), show_symbols=False),
+                                        unsafe_allow_html=True)
     
     elif page == "Dream Journal":
         st.header("📚 Your Dream Journal")
         
-        if 'dream_journal' in st.session_state and st.session_state.dream_journal:
-            for i, entry in enumerate(reversed(st.session_state.dream_journal)):
+        days = journal.days(journal_id)
+        
+        if days:
+            # Filter by date using the journal's date index
+            day_labels = ["All dates"] + [f"{day} ({count})" for day, count in days]
+            day_choice = day_labels.index(st.selectbox("Filter by date:", day_labels))
+            day, count = days[day_choice - 1] if day_choice else (None, sum(count for _, count in days))
+            
+            # Only the selected page of entries is loaded and rendered
+            page_count = max(1, -(-count // JOURNAL_PAGE_SIZE))
+            page_number = st.number_input("Page", min_value=1, max_value=page_count, value=1, step=1)
+            st.caption(f"{count} dreams · page {page_number} of {page_count}")
+            
+            for entry in journal.page(journal_id, page_number - 1, JOURNAL_PAGE_SIZE, day):
                 with st.expander(f"Dream from {entry['date']} - {entry['emotion']}"):
-                    st.write(f"**Dream:** {entry['dream']}")
-                    st.write(f"**Emotion:** {entry['emotion']}")
-                    st.write(f"**Context:** {entry['context']}")
-                    st.write(f"**Interpretation:** {entry['interpretation']}")
-                    
-                    if entry['symbols']:
-                        st.write("**Symbols:**")
-                        for symbol in entry['symbols']:
-                            st.write(f"• {symbol['symbol']}: {symbol['meaning']}")
+                    st.markdown(render.entry_html(entry), unsafe_allow_html=True)
         else:
             st.info("No dreams recorded yet. Go to the Dream Interpretation section to analyze your first dream!")
     
+    elif page == "Dream Patterns":
+        st.header("📈 Dream Patterns")
+        
+        period, buckets = PATTERN_PERIODS[st.radio("Group by:", list(PATTERN_PERIODS), index=1, horizontal=True)]
+        
+        # Read from the journal's bucketed counters, never from the entries themselves
+        with METRICS.timer("patterns"):
+            top_symbols = journal.top(journal_id, "symbol", 10)
+            emotion_trends = journal.trends(journal_id, "emotion", period, buckets)
+            symbol_trends = journal.trends(journal_id, "symbol", period, buckets)
+        
+        if emotion_trends or symbol_trends:
+            import pandas as pd
+            
+            if top_symbols:
+                st.subheader("🔁 Recurring Symbols")
+                st.bar_chart(pd.DataFrame(top_symbols, columns=["symbol", "dreams"]).set_index("symbol"))
+            
+            if emotion_trends:
+                st.subheader("🎭 Emotions Over Time")
+                emotions = pd.DataFrame(emotion_trends, columns=["period", "emotion", "dreams"])
+                st.line_chart(emotions.pivot_table(index="period", columns="emotion", values="dreams", fill_value=0))
+            
+            if symbol_trends:
+                # Only the symbols that recur most in the shown period, to keep the chart readable
+                st.subheader("🌀 Symbols Over Time")
+                symbols = pd.DataFrame(symbol_trends, columns=["period", "symbol", "dreams"])
+                recurring = symbols.groupby("symbol")["dreams"].sum().nlargest(5).index
+                symbols = symbols[symbols["symbol"].isin(recurring)]
+                st.line_chart(symbols.pivot_table(index="period", columns="symbol", values="dreams", fill_value=0))
+        else:
+            st.info("No dreams recorded yet. Patterns appear here once you have interpreted a few dreams.")
+    
     elif page == "About Dream Symbols":
         st.header("🎭 Common Dream Symbols")
         st.write("Understanding dream symbols can help you better interpret your dreams:")
         
-        # Display symbol meanings in a nice format
-        for symbol, meaning in DREAM_SYMBOLS.items():
-            st.markdown(f"**{symbol.title()}:** {meaning}")
+        # Display symbol meanings in a nice format, synonyms together, as a single delta
+        st.markdown(load_symbol_reference(), unsafe_allow_html=True)
         
         st.markdown("---")
         st.info("💡 Remember: Dream symbols can have personal meanings that differ from universal interpretations. The AI considers both common meanings and your personal context.")
 
 if __name__ == "__main__":
+    import sys
+    
+    if sys.argv[1:2] == ["batch"]:
+        sys.exit(batch_main(sys.argv[2:]))
     main()
\ No newline at end of file
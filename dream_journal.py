@@ -0,0 +1,239 @@
+import datetime
+import json
+import re
+import sqlite3
+import threading
+from collections import Counter
+
+# Default location of the journal database, next to the app
+DEFAULT_JOURNAL_PATH = "dream_journal.db"
+
+# Journal ids are also used in URLs and file names
+JOURNAL_ID_PATTERN = re.compile(r"[A-Za-z0-9_-]{1,64}")
+
+# Time buckets of the pattern counters
+PERIODS = ("day", "week", "month")
+
+# Schema version; 1 added the pattern counters
+SCHEMA_VERSION = 1
+
+
+def valid_journal_id(journal_id):
+    return isinstance(journal_id, str) and JOURNAL_ID_PATTERN.fullmatch(journal_id) is not None
+
+
+def period_buckets(date):
+    """Return the (period, bucket) pairs of an entry date such as 2024-01-17 08:30:00"""
+    day = datetime.date.fromisoformat(date[:10])
+    year, week, _ = day.isocalendar()
+    return [("day", day.isoformat()), ("week", f"{year}-W{week:02d}"), ("month", day.strftime("%Y-%m"))]
+
+
+def count_keys(entry):
+    """The (kind, key) pairs an entry adds to the pattern counters"""
+    keys = [("symbol", symbol["symbol"]) for symbol in entry["symbols"]]
+    if entry["emotion"]:
+        keys.append(("emotion", entry["emotion"]))
+    return keys
+
+
+class JournalStore:
+    """Persistent dream journal backed by SQLite
+
+    Entries keep the schema of create_dream_journal_entry. Each journal is
+    identified by a journal_id, so one database can hold the journals of many
+    users. Entries are indexed by journal and insertion order for newest-first
+    pagination, and by journal and day for date lookups.
+
+    Symbol and emotion counts per day, week and month are kept in a stats
+    table, updated in the same transaction as each append, so pattern views
+    read a few bucketed counters instead of scanning entries.
+    """
+
+    def __init__(self, path=DEFAULT_JOURNAL_PATH):
+        self.path = path
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, "
+            "journal_id TEXT NOT NULL, "
+            "date TEXT NOT NULL, "
+            "day TEXT NOT NULL, "
+            "dream TEXT NOT NULL, "
+            "emotion TEXT, "
+            "context TEXT, "
+            "interpretation TEXT, "
+            "symbols TEXT NOT NULL)"
+        )
+        self.db.execute("CREATE INDEX IF NOT EXISTS entries_journal ON entries (journal_id, id)")
+        self.db.execute("CREATE INDEX IF NOT EXISTS entries_day ON entries (journal_id, day)")
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS stats ("
+            "journal_id TEXT NOT NULL, "
+            "kind TEXT NOT NULL, "
+            "period TEXT NOT NULL, "
+            "bucket TEXT NOT NULL, "
+            "key TEXT NOT NULL, "
+            "count INTEGER NOT NULL, "
+            "PRIMARY KEY (journal_id, kind, period, bucket, key)) WITHOUT ROWID"
+        )
+        if self.db.execute("PRAGMA user_version").fetchone()[0] < SCHEMA_VERSION:
+            # Journals written before the counters existed are counted once
+            self.rebuild_stats()
+            self.db.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+        self.db.commit()
+
+    def append(self, journal_id, entry):
+        """Add a journal entry; returns its id"""
+        return self.append_many(journal_id, [entry])[0]
+
+    def append_many(self, journal_id, entries):
+        """Add journal entries in a single transaction; returns their ids
+
+        Every entry is checked before anything is written, and the whole batch
+        is rolled back if any insert fails, so entries and counters never diverge.
+        """
+        rows = []
+        counts = Counter()
+        for entry in entries:
+            for period, bucket in period_buckets(entry["date"]):
+                for kind, key in count_keys(entry):
+                    counts[kind, period, bucket, key] += 1
+            rows.append((
+                journal_id,
+                entry["date"],
+                entry["date"][:10],
+                entry["dream"],
+                entry["emotion"],
+                entry["context"],
+                entry["interpretation"],
+                json.dumps(entry["symbols"]),
+            ))
+
+        ids = []
+        with self.lock, self.db:
+            for row in rows:
+                cursor = self.db.execute(
+                    "INSERT INTO entries (journal_id, date, day, dream, emotion, context, interpretation, symbols) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    row,
+                )
+                ids.append(cursor.lastrowid)
+            self.add_counts(journal_id, counts)
+        return ids
+
+    def add_counts(self, journal_id, counts):
+        """Add {(kind, period, bucket, key): count} to a journal's pattern counters"""
+        self.db.executemany(
+            "INSERT INTO stats (journal_id, kind, period, bucket, key, count) VALUES (?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT (journal_id, kind, period, bucket, key) DO UPDATE SET count = count + excluded.count",
+            [(journal_id, *key, count) for key, count in counts.items()],
+        )
+
+    def rebuild_stats(self):
+        """Recount the pattern counters of every journal from its entries"""
+        self.db.execute("DELETE FROM stats")
+        counts = {}
+        for journal_id, date, emotion, symbols in self.db.execute(
+            "SELECT journal_id, date, emotion, symbols FROM entries"
+        ):
+            entry = {"emotion": emotion, "symbols": json.loads(symbols)}
+            journal_counts = counts.setdefault(journal_id, Counter())
+            for period, bucket in period_buckets(date):
+                for kind, key in count_keys(entry):
+                    journal_counts[kind, period, bucket, key] += 1
+        for journal_id, journal_counts in counts.items():
+            self.add_counts(journal_id, journal_counts)
+
+    def count(self, journal_id, day=None):
+        """Number of entries in a journal, optionally on a single day"""
+        if day is None:
+            query, params = "SELECT COUNT(*) FROM entries WHERE journal_id = ?", (journal_id,)
+        else:
+            query, params = "SELECT COUNT(*) FROM entries WHERE journal_id = ? AND day = ?", (journal_id, day)
+        with self.lock:
+            return self.db.execute(query, params).fetchone()[0]
+
+    def page(self, journal_id, page=0, page_size=10, day=None):
+        """Return one page of entries, newest first"""
+        if day is None:
+            query = "SELECT * FROM entries WHERE journal_id = ? ORDER BY id DESC LIMIT ? OFFSET ?"
+            params = (journal_id, page_size, page * page_size)
+        else:
+            query = "SELECT * FROM entries WHERE journal_id = ? AND day = ? ORDER BY id DESC LIMIT ? OFFSET ?"
+            params = (journal_id, day, page_size, page * page_size)
+        with self.lock:
+            rows = self.db.execute(query, params).fetchall()
+        return [self.row_to_entry(row) for row in rows]
+
+    def days(self, journal_id):
+        """Return (day, entry count) pairs from the date index, newest first"""
+        with self.lock:
+            return self.db.execute(
+                "SELECT day, COUNT(*) FROM entries WHERE journal_id = ? GROUP BY day ORDER BY day DESC",
+                (journal_id,),
+            ).fetchall()
+
+    def since(self, journal_id, after_id, limit=1000):
+        """Return up to limit (id, entry) pairs added after the entry with id after_id, oldest first"""
+        with self.lock:
+            rows = self.db.execute(
+                "SELECT * FROM entries WHERE journal_id = ? AND id > ? ORDER BY id LIMIT ?",
+                (journal_id, after_id, limit),
+            ).fetchall()
+        return [(row[0], self.row_to_entry(row)) for row in rows]
+
+    def get(self, journal_id, ids):
+        """Return {id: entry} for the given entry ids of a journal"""
+        if not ids:
+            return {}
+        placeholders = ", ".join("?" * len(ids))
+        with self.lock:
+            rows = self.db.execute(
+                f"SELECT * FROM entries WHERE journal_id = ? AND id IN ({placeholders})",
+                (journal_id, *ids),
+            ).fetchall()
+        return {row[0]: self.row_to_entry(row) for row in rows}
+
+    def trends(self, journal_id, kind, period, buckets=12):
+        """Return (bucket, key, count) rows of the most recent buckets, oldest first
+
+        kind is "symbol" or "emotion" and period one of PERIODS. The cost depends
+        on the number of buckets asked for, not on the size of the journal.
+        """
+        with self.lock:
+            return self.db.execute(
+                "SELECT bucket, key, count FROM stats WHERE journal_id = ? AND kind = ? AND period = ? "
+                "AND bucket >= (SELECT MIN(bucket) FROM ("
+                "SELECT DISTINCT bucket FROM stats WHERE journal_id = ? AND kind = ? AND period = ? "
+                "ORDER BY bucket DESC LIMIT ?)) "
+                "ORDER BY bucket, key",
+                (journal_id, kind, period, journal_id, kind, period, buckets),
+            ).fetchall()
+
+    def top(self, journal_id, kind, limit=10):
+        """Return the most frequent (key, count) pairs of a journal, summed over its months"""
+        with self.lock:
+            return self.db.execute(
+                "SELECT key, SUM(count) AS total FROM stats WHERE journal_id = ? AND kind = ? AND period = 'month' "
+                "GROUP BY key ORDER BY total DESC, key LIMIT ?",
+                (journal_id, kind, limit),
+            ).fetchall()
+
+    @staticmethod
+    def row_to_entry(row):
+        _, _, date, _, dream, emotion, context, interpretation, symbols = row
+        return {
+            "date": date,
+            "dream": dream,
+            "emotion": emotion,
+            "context": context,
+            "interpretation": interpretation,
+            "symbols": json.loads(symbols),
+        }
+
+    def close(self):
+        with self.lock:
+            self.db.close()
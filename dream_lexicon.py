@@ -0,0 +1,442 @@
+#!/usr/bin/env python3
+"""
+Dream symbol lexicon: external source file, compact compiled format and memory-mapped loading
+
+The source (dream_symbols.json) lists synonym groups that share one meaning:
+
+    {"groups": [{"terms": ["death", "dying"], "meaning": "transformation, ..."}]}
+
+An inflection table (dream_symbols.inflections.json) maps surface forms such as
+"flew", "snakes" or "chased" to lexicon terms. It is generated offline from
+the source with the inflect command and can be edited by hand.
+
+Both are compiled into a flat binary file (dream_symbols.lex) that is loaded
+with mmap, so every worker process on a machine shares the same page-cached
+copy instead of building its own dict. Usage:
+
+    python dream_lexicon.py inflect [source.json] [output.inflections.json]
+    python dream_lexicon.py compile [source.json] [output.lex]
+    python dream_lexicon.py stats [lexicon.lex]
+"""
+
+import hashlib
+import json
+import mmap
+import os
+import re
+import struct
+import sys
+import zlib
+from array import array
+from collections.abc import Mapping
+
+# Word tokens: letters/digits with inner apostrophes or hyphens ("don't", "half-awake")
+WORD_PATTERN = re.compile(r"[^\W_]+(?:['’-][^\W_]+)*")
+
+LEXICON_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_SOURCE_PATH = os.path.join(LEXICON_DIR, "dream_symbols.json")
+
+# magic, terms, visible terms, meanings, hash buckets, max words per term, term bytes, meaning bytes
+HEADER = struct.Struct("<8s7I")
+MAGIC = b"DRMLEX01"
+
+# canonical id of entries that only exist as the prefix of a multi-word term
+NO_TERM = 0xFFFFFFFF
+
+# lookup() result for a phrase that is not a symbol but starts a longer one
+PREFIX_ONLY = object()
+
+
+def normalize_term(term):
+    """Lowercase a term and join its words with single spaces, as the matcher sees them"""
+    return " ".join(word.lower().replace("’", "'") for word in WORD_PATTERN.findall(term))
+
+
+def inflections_path(source):
+    return os.path.splitext(source)[0] + ".inflections.json"
+
+
+def read_inflections(path):
+    """Read the surface form -> term table, or an empty one if there is none"""
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)["inflections"]
+    except FileNotFoundError:
+        return {}
+
+
+def read_source(path):
+    """Read (terms, meaning) synonym groups from a JSON source file"""
+    with open(path, encoding="utf-8") as f:
+        data = json.load(f)
+    return [(group["terms"], group["meaning"]) for group in data["groups"]]
+
+
+def uint32_bytes(values):
+    data = array("I", values)
+    if sys.byteorder != "little":
+        data.byteswap()
+    return data.tobytes()
+
+
+def compile_lexicon(groups, inflections=None):
+    """Compile (terms, meaning) groups and inflections into the binary lexicon format
+
+    Layout after the header, all integers little-endian uint32:
+    term offsets [terms + 1], canonical term ids [terms], meaning ids [terms],
+    meaning offsets [meanings + 1], hash buckets [buckets], then the UTF-8 term
+    and meaning blobs. Identical meanings are stored once. The first term of a
+    group is its canonical symbol; if a term appears twice the later group wins.
+    Inflected forms resolve to the same symbol and meaning as their term but are
+    hidden from iteration; they never override a real term.
+    """
+    terms, term_ids, canonical, meaning_of = [], {}, [], []
+    meanings, meaning_ids = [], {}
+
+    for group_terms, meaning in groups:
+        if meaning not in meaning_ids:
+            meaning_ids[meaning] = len(meanings)
+            meanings.append(meaning)
+        head = None
+        for term in group_terms:
+            phrase = normalize_term(term)
+            if not phrase:
+                continue
+            if phrase not in term_ids:
+                term_ids[phrase] = len(terms)
+                terms.append(phrase)
+                canonical.append(NO_TERM)
+                meaning_of.append(0)
+            term_id = term_ids[phrase]
+            head = term_id if head is None else head
+            canonical[term_id] = head
+            meaning_of[term_id] = meaning_ids[meaning]
+
+    visible = len(terms)
+    for surface, term in (inflections or {}).items():
+        surface, target = normalize_term(surface), term_ids.get(normalize_term(term))
+        if surface and surface not in term_ids and target is not None and target < visible:
+            term_ids[surface] = len(terms)
+            terms.append(surface)
+            canonical.append(canonical[target])
+            meaning_of.append(meaning_of[target])
+
+    # Prefixes of multi-word terms let the matcher stop extending a phrase early
+    for phrase in terms[:visible]:
+        words = phrase.split(" ")
+        for n in range(1, len(words)):
+            prefix = " ".join(words[:n])
+            if prefix not in term_ids:
+                term_ids[prefix] = len(terms)
+                terms.append(prefix)
+                canonical.append(NO_TERM)
+                meaning_of.append(0)
+
+    max_words = max((phrase.count(" ") + 1 for phrase in terms), default=0)
+
+    # Open-addressing hash table, at most half full
+    n_buckets = 8
+    while n_buckets < 2 * len(terms):
+        n_buckets *= 2
+    buckets = [0] * n_buckets
+    encoded_terms = [phrase.encode("utf-8") for phrase in terms]
+    for term_id, key in enumerate(encoded_terms):
+        slot = zlib.crc32(key) & (n_buckets - 1)
+        while buckets[slot]:
+            slot = (slot + 1) & (n_buckets - 1)
+        buckets[slot] = term_id + 1
+
+    encoded_meanings = [meaning.encode("utf-8") for meaning in meanings]
+    term_offsets = [0]
+    for key in encoded_terms:
+        term_offsets.append(term_offsets[-1] + len(key))
+    meaning_offsets = [0]
+    for text in encoded_meanings:
+        meaning_offsets.append(meaning_offsets[-1] + len(text))
+
+    return b"".join([
+        HEADER.pack(MAGIC, len(terms), visible, len(meanings), n_buckets, max_words,
+                    term_offsets[-1], meaning_offsets[-1]),
+        uint32_bytes(term_offsets),
+        uint32_bytes(canonical),
+        uint32_bytes(meaning_of),
+        uint32_bytes(meaning_offsets),
+        uint32_bytes(buckets),
+        b"".join(encoded_terms),
+        b"".join(encoded_meanings),
+    ])
+
+
+class Lexicon(Mapping):
+    """Read-only term -> meaning mapping over a compiled lexicon buffer
+
+    The buffer is usually a read-only mmap of a .lex file. Integer arrays are
+    zero-copy views into it; only the terms and meanings that are actually
+    used get decoded into Python strings.
+    """
+
+    def __init__(self, buffer):
+        magic, n_terms, visible, n_meanings, n_buckets, max_words, term_size, meaning_size = \
+            HEADER.unpack_from(buffer, 0)
+        if magic != MAGIC:
+            raise ValueError("Not a compiled dream lexicon")
+
+        self.buffer = buffer
+        self.n_terms = n_terms
+        self.visible = visible
+        self.n_buckets = n_buckets
+        self.max_words = max_words
+
+        view = memoryview(buffer)
+        offset = HEADER.size
+
+        def take(count):
+            nonlocal offset
+            section = view[offset:offset + 4 * count]
+            offset += 4 * count
+            if sys.byteorder == "little":
+                return section.cast("I")
+            data = array("I", section)
+            data.byteswap()
+            return data
+
+        self.term_offsets = take(n_terms + 1)
+        self.canonical = take(n_terms)
+        self.meaning_of = take(n_terms)
+        self.meaning_offsets = take(n_meanings + 1)
+        self.buckets = take(n_buckets)
+        self.term_base = offset
+        self.meaning_base = offset + term_size
+
+        self.decoded_terms = {}
+        self.decoded_meanings = {}
+
+    @classmethod
+    def load(cls, path):
+        """Memory-map a compiled lexicon file"""
+        with open(path, "rb") as f:
+            return cls(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+
+    def fingerprint(self):
+        """Digest of the compiled lexicon, which changes with any edit to its source or inflections"""
+        return hashlib.sha256(self.buffer).hexdigest()
+
+    def term_bytes(self, term_id):
+        return self.buffer[self.term_base + self.term_offsets[term_id]:self.term_base + self.term_offsets[term_id + 1]]
+
+    def term(self, term_id):
+        term = self.decoded_terms.get(term_id)
+        if term is None:
+            term = self.decoded_terms[term_id] = self.term_bytes(term_id).decode("utf-8")
+        return term
+
+    def meaning(self, meaning_id):
+        meaning = self.decoded_meanings.get(meaning_id)
+        if meaning is None:
+            start = self.meaning_base + self.meaning_offsets[meaning_id]
+            end = self.meaning_base + self.meaning_offsets[meaning_id + 1]
+            meaning = self.decoded_meanings[meaning_id] = self.buffer[start:end].decode("utf-8")
+        return meaning
+
+    def find(self, phrase):
+        """Return the term id of a normalized phrase, or None"""
+        key = phrase.encode("utf-8")
+        mask = self.n_buckets - 1
+        slot = zlib.crc32(key) & mask
+        while True:
+            entry = self.buckets[slot]
+            if not entry:
+                return None
+            if self.term_bytes(entry - 1) == key:
+                return entry - 1
+            slot = (slot + 1) & mask
+
+    def lookup(self, phrase):
+        """Resolve a normalized phrase to (canonical symbol, meaning), PREFIX_ONLY or None"""
+        term_id = self.find(phrase)
+        if term_id is None:
+            return None
+        head = self.canonical[term_id]
+        if head == NO_TERM:
+            return PREFIX_ONLY
+        return self.term(head), self.meaning(self.meaning_of[term_id])
+
+    def __getitem__(self, term):
+        term_id = self.find(normalize_term(term))
+        if term_id is None or self.canonical[term_id] == NO_TERM:
+            raise KeyError(term)
+        return self.meaning(self.meaning_of[term_id])
+
+    def __iter__(self):
+        return (self.term(term_id) for term_id in range(self.visible))
+
+    def __len__(self):
+        return self.visible
+
+    def groups(self):
+        """Return (terms, meaning) synonym groups, in source order"""
+        groups = {}
+        for term_id in range(self.visible):
+            head = self.canonical[term_id]
+            if head not in groups:
+                groups[head] = ([], self.meaning(self.meaning_of[term_id]))
+            groups[head][0].append(self.term(term_id))
+        return list(groups.values())
+
+
+def write_lexicon(groups, path, inflections=None):
+    """Compile groups and atomically write them to path"""
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(compile_lexicon(groups, inflections))
+    os.replace(tmp_path, path)
+
+
+def load_lexicon(source=None, path=None):
+    """Load the compiled lexicon, recompiling it first if the source is newer
+
+    Falls back to an in-memory compiled copy if the .lex file can't be written.
+    """
+    source = source or os.environ.get("DREAM_LEXICON", DEFAULT_SOURCE_PATH)
+    path = path or os.path.splitext(source)[0] + ".lex"
+    inflections = inflections_path(source)
+
+    try:
+        compiled = os.path.getmtime(path)
+        fresh = compiled >= os.path.getmtime(source) and (
+            not os.path.exists(inflections) or compiled >= os.path.getmtime(inflections)
+        )
+    except OSError:
+        fresh = False
+
+    if not fresh:
+        try:
+            write_lexicon(read_source(source), path, read_inflections(inflections))
+        except OSError:
+            return Lexicon(compile_lexicon(read_source(source), read_inflections(inflections)))
+
+    return Lexicon.load(path)
+
+
+# Inflection builder data. Forms that simple suffix rules get wrong; the
+# generated table is committed, so these only matter when rebuilding it.
+VERB_BASES = {"flying": "fly", "falling": "fall", "running": "run", "driving": "drive",
+              "chasing": "chase", "dying": "die", "lying": "lie", "swimming": "swim"}
+IRREGULAR_VERBS = {
+    "fly": ["flew", "flown"], "fall": ["fell", "fallen"], "run": ["ran"], "drive": ["drove", "driven"],
+    "swim": ["swam", "swum"], "sink": ["sank", "sunk"], "lose": ["lost"], "fight": ["fought"],
+    "hide": ["hid", "hidden"], "bite": ["bit", "bitten"], "lie": ["lay", "lain"],
+}
+EXTRA_FORMS = {"die": ["dead"]}
+UNINFLECTED = {"lost", "darkness"}
+# Verb forms that are just as often nouns ("a fly landed", "in the fall"), never matched as inflections
+NOUN_HOMOGRAPHS = {"fly", "flies", "fall", "falls", "run", "runs", "drive", "drives", "die", "dies"}
+IRREGULAR_PLURALS = {"tooth": "teeth", "mouse": "mice", "child": "children", "man": "men",
+                     "woman": "women", "foot": "feet", "knife": "knives", "wolf": "wolves"}
+
+
+def verb_base(gerund):
+    """Guess the base form of an -ing verb"""
+    if gerund in VERB_BASES:
+        return VERB_BASES[gerund]
+    stem = gerund[:-3]
+    if len(stem) > 2 and stem[-1] == stem[-2] and stem[-1] not in "lsz":
+        return stem[:-1]
+    return stem
+
+
+def add_s(word):
+    if word.endswith(("s", "x", "z", "ch", "sh", "o")):
+        return word + "es"
+    if len(word) > 1 and word.endswith("y") and word[-2] not in "aeiou":
+        return word[:-1] + "ies"
+    return word + "s"
+
+
+def verb_forms(base):
+    """Base, third person and past forms of a verb"""
+    if base in IRREGULAR_VERBS:
+        past = IRREGULAR_VERBS[base]
+    elif base.endswith("e"):
+        past = [base + "d"]
+    elif len(base) > 1 and base.endswith("y") and base[-2] not in "aeiou":
+        past = [base[:-1] + "ied"]
+    else:
+        past = [base + "ed"]
+    return [base, add_s(base)] + past + EXTRA_FORMS.get(base, [])
+
+
+def noun_forms(noun):
+    """Singular, plural and possessive forms of a noun"""
+    if noun.endswith("s") and not noun.endswith("ss"):
+        singular = noun[:-3] + "y" if noun.endswith("ies") else noun[:-1]
+        return [singular, singular + "'s"]
+    return [add_s(noun) if noun not in IRREGULAR_PLURALS else IRREGULAR_PLURALS[noun], noun + "'s"]
+
+
+def build_inflections(groups):
+    """Generate a surface form -> term table for the single-word terms of a lexicon
+
+    A rule-based stand-in for a lemmatizer: -ing terms (and the other terms in
+    their group that share the verb base, like "chase") get verb forms, every
+    other term gets noun forms. Forms that are themselves terms, or that two
+    terms would claim, are left out.
+    """
+    terms = {normalize_term(term) for group_terms, _ in groups for term in group_terms}
+    candidates = {}
+
+    for group, (group_terms, _) in enumerate(groups):
+        words = [normalize_term(term) for term in group_terms if " " not in normalize_term(term)]
+        bases = {verb_base(word) for word in words if word.endswith("ing")}
+        for word in words:
+            if word in UNINFLECTED:
+                continue
+            if word.endswith("ing"):
+                forms = verb_forms(verb_base(word))
+            elif word in bases:
+                forms = verb_forms(word) + noun_forms(word)
+            else:
+                forms = noun_forms(word)
+            for form in forms:
+                if form not in terms and form not in NOUN_HOMOGRAPHS:
+                    candidates.setdefault(form, {}).setdefault(group, word)
+
+    # Forms claimed by more than one group are ambiguous and left out
+    return {form: next(iter(claims.values())) for form, claims in sorted(candidates.items()) if len(claims) == 1}
+
+
+def write_inflections(inflections, path):
+    with open(path, "w", encoding="utf-8") as f:
+        f.write('{\n  "inflections": {\n')
+        f.write(",\n".join(f"    {json.dumps(form)}: {json.dumps(term)}" for form, term in inflections.items()))
+        f.write("\n  }\n}\n")
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    command = argv[0] if argv else "stats"
+
+    if command == "inflect":
+        source = argv[1] if len(argv) > 1 else DEFAULT_SOURCE_PATH
+        output = argv[2] if len(argv) > 2 else inflections_path(source)
+        inflections = build_inflections(read_source(source))
+        write_inflections(inflections, output)
+        print(f"✅ Wrote {len(inflections)} inflected forms to {output}")
+    elif command == "compile":
+        source = argv[1] if len(argv) > 1 else DEFAULT_SOURCE_PATH
+        output = argv[2] if len(argv) > 2 else os.path.splitext(source)[0] + ".lex"
+        write_lexicon(read_source(source), output, read_inflections(inflections_path(source)))
+        print(f"✅ Compiled {source} -> {output} ({os.path.getsize(output)} bytes)")
+    elif command == "stats":
+        lexicon = Lexicon.load(argv[1]) if len(argv) > 1 else load_lexicon()
+        print(f"Terms: {len(lexicon)}, synonym groups: {len(lexicon.groups())}, "
+              f"meanings: {len(lexicon.meaning_offsets) - 1}, longest term: {lexicon.max_words} words, "
+              f"size: {len(lexicon.buffer)} bytes")
+    else:
+        print(__doc__)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
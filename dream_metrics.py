@@ -0,0 +1,191 @@
+import os
+import threading
+import time
+
+# Latency histogram bucket upper bounds, in seconds
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class NullTimer:
+    """Timer used while metrics are disabled; does nothing"""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+NULL_TIMER = NullTimer()
+
+
+class StageTimer:
+    """Context manager that records the duration of one pipeline stage"""
+    __slots__ = ("metrics", "stage", "start")
+
+    def __init__(self, metrics, stage):
+        self.metrics = metrics
+        self.stage = stage
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.metrics.observe(self.stage, time.perf_counter() - self.start)
+        return False
+
+
+class Histogram:
+    """Cumulative latency histogram in the Prometheus style"""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+    def quantile(self, q):
+        """Estimate a quantile as the upper bound of the bucket that contains it"""
+        target = q * self.count
+        seen = 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= target:
+                return bound
+        return self.max
+
+
+class Metrics:
+    """Per-stage timers, event counters and latency histograms for the interpretation pipeline
+
+    When disabled, timer() returns a shared no-op object and inc() returns at
+    once, so instrumented code costs next to nothing.
+    """
+
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self.lock = threading.Lock()
+        self.histograms = {}
+        self.counters = {}
+
+    def timer(self, stage):
+        """Time a stage: with metrics.timer("identify_symbols"): ..."""
+        if not self.enabled:
+            return NULL_TIMER
+        return StageTimer(self, stage)
+
+    def observe(self, stage, seconds):
+        if not self.enabled:
+            return
+        with self.lock:
+            histogram = self.histograms.get(stage)
+            if histogram is None:
+                histogram = self.histograms[stage] = Histogram()
+            histogram.observe(seconds)
+
+    def inc(self, event, amount=1):
+        """Count an event such as a cache hit or a model load"""
+        if not self.enabled:
+            return
+        with self.lock:
+            self.counters[event] = self.counters.get(event, 0) + amount
+
+    def snapshot(self):
+        """Return per-stage summaries and event counts, for display"""
+        with self.lock:
+            stages = {
+                stage: {
+                    "count": h.count,
+                    "mean_ms": h.sum / h.count * 1000 if h.count else 0.0,
+                    "p50_ms": h.quantile(0.5) * 1000,
+                    "p95_ms": h.quantile(0.95) * 1000,
+                    "max_ms": h.max * 1000,
+                }
+                for stage, h in self.histograms.items()
+            }
+            return stages, dict(self.counters)
+
+    def render_prometheus(self):
+        """Render all metrics in the Prometheus text exposition format"""
+        lines = [
+            "# HELP dream_stage_seconds Time spent in each interpretation pipeline stage",
+            "# TYPE dream_stage_seconds histogram",
+        ]
+        with self.lock:
+            for stage, h in sorted(self.histograms.items()):
+                cumulative = 0
+                for bound, count in zip(h.buckets, h.counts):
+                    cumulative += count
+                    lines.append(f'dream_stage_seconds_bucket{{stage="{stage}",le="{bound}"}} {cumulative}')
+                lines.append(f'dream_stage_seconds_bucket{{stage="{stage}",le="+Inf"}} {h.count}')
+                lines.append(f'dream_stage_seconds_sum{{stage="{stage}"}} {h.sum}')
+                lines.append(f'dream_stage_seconds_count{{stage="{stage}"}} {h.count}')
+
+            lines.append("# HELP dream_events_total Pipeline events such as cache hits and model loads")
+            lines.append("# TYPE dream_events_total counter")
+            for event, count in sorted(self.counters.items()):
+                lines.append(f'dream_events_total{{event="{event}"}} {count}')
+        return "\n".join(lines) + "\n"
+
+    def write_scrape_file(self, path):
+        """Atomically write the metrics to a file for a textfile collector"""
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            f.write(self.render_prometheus())
+        os.replace(tmp_path, path)
+
+    def start_scrape_file_writer(self, path, interval=15.0):
+        """Rewrite the scrape file every interval seconds from a background thread"""
+        def run():
+            while True:
+                self.write_scrape_file(path)
+                time.sleep(interval)
+
+        thread = threading.Thread(target=run, name="metrics-file-writer", daemon=True)
+        thread.start()
+        return thread
+
+    def serve(self, port, host="127.0.0.1"):
+        """Serve the metrics at http://host:port/metrics from a background thread
+
+        Listens on localhost only unless a host such as "0.0.0.0" is given.
+        """
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+        metrics = self
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path != "/metrics":
+                    self.send_error(404)
+                    return
+                body = metrics.render_prometheus().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        server = ThreadingHTTPServer((host, port), MetricsHandler)
+        threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+        return server
+
+
+# Process-wide metrics, enabled by DREAM_METRICS=1 or by configuring an exporter
+METRICS = Metrics(enabled=any(
+    os.environ.get(name, "") not in ("", "0") for name in ("DREAM_METRICS", "DREAM_METRICS_FILE", "DREAM_METRICS_PORT")
+))
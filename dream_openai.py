@@ -0,0 +1,295 @@
+#!/usr/bin/env python3
+"""
+OpenAI-compatible generation backend, and a local stand-in server for it
+
+The client sends chat completion requests to any OpenAI-compatible endpoint
+(OpenAI itself, or an inference box running vLLM, llama.cpp and the like).
+It is configured from the environment:
+
+    OPENAI_BASE_URL       endpoint, e.g. http://inference-box:8000/v1
+    OPENAI_API_KEY        API key, if the endpoint needs one
+    DREAM_OPENAI_MODEL    model name (default gpt-3.5-turbo)
+
+The stand-in server answers chat completions locally with canned text, an
+optional delay and an optional failure rate, for tests and benchmarks:
+
+    python dream_openai.py stub --port 8001 --delay 0.2 --failure-rate 0.1
+"""
+
+import asyncio
+import json
+import os
+import random
+import sys
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from dream_metrics import METRICS
+
+DEFAULT_MODEL = "gpt-3.5-turbo"
+
+SYSTEM_PROMPT = (
+    "You are a thoughtful dream interpreter. Given a dream, the dreamer's feelings and "
+    "life context, reply with a short psychological interpretation of at most three sentences."
+)
+
+
+class BackendUnavailable(RuntimeError):
+    """The client cannot be started, e.g. because the openai package is not installed"""
+
+
+class OpenAICompatibleClient:
+    """Chat completions from synchronous code through one pooled async client
+
+    A private event loop runs in a background thread and owns a single
+    AsyncOpenAI client, so every call reuses the same keep-alive connection
+    pool. At most max_concurrency requests are in flight at once, across all
+    callers. Connection errors, timeouts, 429s and 5xx responses are retried
+    with full-jitter exponential backoff while the caller's budget allows;
+    anything else gives None so the caller can fall back.
+    """
+
+    def __init__(self, base_url=None, model=DEFAULT_MODEL, api_key=None, max_concurrency=8,
+                 timeout=5.0, max_retries=2, backoff=0.2, max_tokens=80, temperature=0.8):
+        self.base_url = base_url
+        self.model = model
+        self.api_key = api_key
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_tokens = max_tokens
+        self.temperature = temperature
+        self.lock = threading.Lock()
+        self.loop = None
+        self.start_error = None
+
+    @classmethod
+    def from_env(cls, **kwargs):
+        return cls(
+            base_url=os.environ.get("OPENAI_BASE_URL") or None,
+            model=os.environ.get("DREAM_OPENAI_MODEL", DEFAULT_MODEL),
+            api_key=os.environ.get("OPENAI_API_KEY"),
+            **kwargs,
+        )
+
+    def start(self):
+        """Create the event loop, connection pool and client on first use
+
+        Raises BackendUnavailable if the client libraries are missing; the
+        failure is remembered, so later calls do not retry the import.
+        """
+        with self.lock:
+            if self.start_error is not None:
+                raise BackendUnavailable(self.start_error)
+            if self.loop is None:
+                try:
+                    import httpx
+                    from openai import AsyncOpenAI
+                except ImportError as e:
+                    self.start_error = f"OpenAI-compatible backend needs the openai package: {e}"
+                    raise BackendUnavailable(self.start_error) from e
+
+                limits = httpx.Limits(max_connections=self.max_concurrency,
+                                      max_keepalive_connections=self.max_concurrency)
+                # Retries are done here, with jitter and within the caller's budget
+                self.client = AsyncOpenAI(
+                    base_url=self.base_url,
+                    # Local endpoints accept any key, but the client insists on one
+                    api_key=self.api_key or "not-needed",
+                    max_retries=0,
+                    timeout=self.timeout,
+                    http_client=httpx.AsyncClient(limits=limits, timeout=self.timeout),
+                )
+                self.semaphore = asyncio.Semaphore(self.max_concurrency)
+                loop = asyncio.new_event_loop()
+                threading.Thread(target=loop.run_forever, name="openai-client", daemon=True).start()
+                self.loop = loop
+        return self.loop
+
+    def complete_many(self, conversations, budget):
+        """Complete each list of chat messages within budget seconds
+
+        Returns one text per conversation, or None where the request failed or
+        did not finish in time. Raises BackendUnavailable if the client cannot start.
+        """
+        # Started before the coroutine is created, so a failed start leaves none unawaited
+        loop = self.start()
+        future = asyncio.run_coroutine_threadsafe(self.complete_all(conversations, budget), loop)
+        try:
+            # The coroutine stops itself at the deadline; this only guards against a stuck loop
+            return future.result(budget + 1.0)
+        except Exception:
+            future.cancel()
+            return [None] * len(conversations)
+
+    async def complete_all(self, conversations, budget):
+        deadline = time.monotonic() + budget
+        return await asyncio.gather(*(self.complete(messages, deadline) for messages in conversations))
+
+    async def complete(self, messages, deadline):
+        import openai
+
+        for attempt in range(self.max_retries + 1):
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                async with self.semaphore:
+                    response = await asyncio.wait_for(self.client.chat.completions.create(
+                        model=self.model,
+                        messages=messages,
+                        max_tokens=self.max_tokens,
+                        temperature=self.temperature,
+                        timeout=min(self.timeout, remaining),
+                    ), deadline - time.monotonic())
+                text = response.choices[0].message.content if response.choices else None
+                return text.strip() if text and text.strip() else None
+            except (asyncio.TimeoutError, openai.APIConnectionError, openai.RateLimitError,
+                    openai.InternalServerError):
+                METRICS.inc("remote_retry")
+            except openai.OpenAIError:
+                # Bad request, bad key, unknown model: retrying will not help
+                break
+
+            # Full jitter: sleep anywhere up to the exponential backoff, within the deadline
+            delay = random.uniform(0, self.backoff * 2 ** attempt)
+            if attempt == self.max_retries or time.monotonic() + delay >= deadline:
+                break
+            await asyncio.sleep(delay)
+
+        METRICS.inc("remote_failure")
+        return None
+
+    def close(self):
+        with self.lock:
+            if self.loop is not None:
+                asyncio.run_coroutine_threadsafe(self.client.close(), self.loop).result(5)
+                self.loop.call_soon_threadsafe(self.loop.stop)
+                self.loop = None
+
+
+class StubHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # Clients that give up at their deadline disconnect before the reply is written
+        if isinstance(sys.exc_info()[1], ConnectionError):
+            return
+        super().handle_error(request, client_address)
+
+
+class StubCompletionServer:
+    """Local stand-in for an OpenAI-compatible chat completions endpoint
+
+    Answers POST /v1/chat/completions with a canned interpretation that echoes
+    the dream, after delay seconds, failing with a 503 at failure_rate. Counts
+    requests and TCP connections, so tests can check connection reuse.
+    """
+
+    def __init__(self, host="127.0.0.1", port=0, delay=0.0, failure_rate=0.0, seed=None):
+        self.delay = delay
+        self.failure_rate = failure_rate
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.connections = 0
+        self.server = StubHTTPServer((host, port), self.make_handler())
+        self.host, self.port = self.server.server_address[:2]
+        self.url = f"http://{self.host}:{self.port}/v1"
+
+    def make_handler(self):
+        stub = self
+
+        class CompletionHandler(BaseHTTPRequestHandler):
+            # HTTP/1.1 keeps connections open between requests; without Nagle's
+            # algorithm the separate header and body writes are not held back
+            protocol_version = "HTTP/1.1"
+            disable_nagle_algorithm = True
+
+            def setup(self):
+                super().setup()
+                with stub.lock:
+                    stub.connections += 1
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                if self.path.rstrip("/") != "/v1/chat/completions":
+                    self.reply(404, {"error": {"message": "Not found"}})
+                    return
+                with stub.lock:
+                    stub.requests += 1
+                    fail = stub.random.random() < stub.failure_rate
+                if stub.delay:
+                    time.sleep(stub.delay)
+                if fail:
+                    self.reply(503, {"error": {"message": "Stub failure"}})
+                    return
+
+                request = json.loads(body)
+                prompt = request["messages"][-1]["content"]
+                dream = prompt.splitlines()[0].removeprefix("Dream: ")
+                self.reply(200, {
+                    "id": f"chatcmpl-{uuid.uuid4().hex}",
+                    "object": "chat.completion",
+                    "created": int(time.time()),
+                    "model": request.get("model", DEFAULT_MODEL),
+                    "choices": [{
+                        "index": 0,
+                        "message": {
+                            "role": "assistant",
+                            "content": f"This dream of {dream[:60].rstrip('.')} reflects feelings you are still working through. "
+                                       "It suggests paying attention to what feels unresolved in your waking life.",
+                        },
+                        "finish_reason": "stop",
+                    }],
+                    "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0},
+                })
+
+            def reply(self, status, payload):
+                data = json.dumps(payload).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, *args):
+                pass
+
+        return CompletionHandler
+
+    def start(self):
+        """Serve from a background thread; returns self"""
+        threading.Thread(target=self.server.serve_forever, name="openai-stub", daemon=True).start()
+        return self
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Local stand-in for an OpenAI-compatible endpoint")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    stub = subparsers.add_parser("stub", help="serve canned chat completions")
+    stub.add_argument("--host", default="127.0.0.1")
+    stub.add_argument("--port", type=int, default=8001)
+    stub.add_argument("--delay", type=float, default=0.0, help="seconds to wait before each reply")
+    stub.add_argument("--failure-rate", type=float, default=0.0, help="fraction of requests answered with 503")
+    args = parser.parse_args(argv)
+
+    server = StubCompletionServer(args.host, args.port, args.delay, args.failure_rate)
+    print(f"Serving chat completions at {server.url} (OPENAI_BASE_URL={server.url})")
+    try:
+        server.server.serve_forever()
+    except KeyboardInterrupt:
+        server.close()
+
+
+if __name__ == "__main__":
+    main()
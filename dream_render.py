@@ -0,0 +1,108 @@
+"""
+HTML fragments for the Streamlit pages
+
+Every st.markdown call is a separate delta sent to the browser, so each page
+section is built here as one HTML string and sent with a single call. The
+functions are pure and cheap to cache: static fragments like the symbol
+reference are rendered once per process, not on every rerun.
+"""
+
+from html import escape
+
+STYLE = """<style>
+.main-header {
+    text-align: center;
+    color: #2C3E50;
+    font-size: 3rem;
+    margin-bottom: 2rem;
+}
+.dream-box {
+    background-color: #fdfdfd;
+    color: #1C1C1C;
+    padding: 20px;
+    border-radius: 10px;
+    margin: 10px 0;
+}
+.interpretation-box {
+    background-color: #eef6fc;
+    color: #1C1C1C;
+    padding: 20px;
+    border-radius: 10px;
+    border-left: 4px solid #3498DB;
+}
+.symbol-box {
+    background-color: #fff8e1;
+    color: #1C1C1C;
+    padding: 15px;
+    border-radius: 8px;
+    margin: 5px 0;
+    border-left: 4px solid #f1c40f;
+}
+.insights {
+    display: grid;
+    grid-template-columns: 1fr 1fr;
+    gap: 1rem;
+}
+</style>"""
+
+# Styles, title and tagline in one fragment, sent once per rerun
+HEADER = (
+    STYLE
+    + '<h1 class="main-header">🌙 AI Dream Interpreter</h1>'
+    + "<h3><em>Unlock the mysteries of your dreams with AI-powered interpretation</em></h3>"
+)
+
+EMOTION_INSIGHTS = {
+    "Anxious": "Your anxiety in the dream may reflect current worries or uncertainties.",
+    "Happy": "Positive emotions suggest harmony and contentment in your life.",
+    "Scared": "Fear in dreams often represents facing the unknown or personal challenges.",
+}
+DEFAULT_INSIGHT = "Your emotions in the dream provide clues about your current state of mind."
+
+RECOMMENDATIONS = [
+    "Keep a dream journal to track patterns",
+    "Reflect on how the dream relates to your current life",
+    "Consider what changes the dream might be suggesting",
+]
+
+
+def text(value):
+    """Escape user or model text for HTML; line breaks are kept, since a blank line would end the HTML block"""
+    return escape(str(value)).replace("\n", "<br>")
+
+
+def interpretation_html(interpretation):
+    return ('<div class="interpretation-box"><h4 style="color:black;">Psychological Analysis:</h4>'
+            f"<p>{text(interpretation)}</p></div>")
+
+
+def symbols_html(symbols):
+    """All symbol boxes of a result as one fragment"""
+    return "".join(f'<div class="symbol-box"><strong>{text(symbol.title())}:</strong> {text(meaning)}</div>'
+                   for symbol, meaning in symbols)
+
+
+def insights_html(emotion):
+    """Emotional significance and recommendations side by side"""
+    recommendations = "".join(f"<li>{text(item)}</li>" for item in RECOMMENDATIONS)
+    return ('<div class="insights">'
+            f"<div><strong>Emotional Significance:</strong><p>{text(EMOTION_INSIGHTS.get(emotion, DEFAULT_INSIGHT))}</p></div>"
+            f"<div><strong>Recommendations:</strong><ul>{recommendations}</ul></div>"
+            "</div>")
+
+
+def entry_html(entry, fields=("dream", "emotion", "context", "interpretation"), show_symbols=True):
+    """The body of a journal entry's expander"""
+    parts = [f"<p><strong>{field.title()}:</strong> {text(entry[field])}</p>" for field in fields]
+    if show_symbols and entry["symbols"]:
+        items = "".join(f"<li>{text(s['symbol'])}: {text(s['meaning'])}</li>" for s in entry["symbols"])
+        parts.append(f"<p><strong>Symbols:</strong></p><ul>{items}</ul>")
+    return "<div>" + "".join(parts) + "</div>"
+
+
+def symbol_reference_html(groups):
+    """The whole symbol reference, synonyms together, as one fragment"""
+    return "<div>" + "".join(
+        f"<p><strong>{text(' / '.join(term.title() for term in terms))}:</strong> {text(meaning)}</p>"
+        for terms, meaning in groups
+    ) + "</div>"
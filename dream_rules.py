@@ -0,0 +1,229 @@
+"""
+Declarative interpretation rules, compiled into an index keyed by trigger
+
+Rules live in dream_rules.json. Each rule belongs to one analysis stage, has a
+priority and a text template, and fires when all of its conditions hold:
+
+    {"id": "chase-dog", "stage": "narrative", "priority": 100,
+     "when": {"symbols": ["chase", "dog"]}, "text": "Being chased by a dog ..."}
+
+Conditions:
+    symbol       the symbol being analyzed (symbol stage only)
+    symbols      all of these symbols appear in the dream
+    any_symbols  any of these symbols appear in the dream
+    words        all of these words appear in the dream
+    any_words    any of these words appear in the dream
+    emotions     the reported emotion is one of these
+    context_any  a word of the life context starts with one of these keywords
+
+Every rule is indexed under one of its required triggers, so a request only
+evaluates the rules whose trigger symbol, word, emotion or keyword is present.
+Templates may use {symbol} and {meaning}.
+"""
+
+import hashlib
+import json
+import os
+
+from dream_lexicon import WORD_PATTERN
+
+RULES_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_RULES_PATH = os.path.join(RULES_DIR, "dream_rules.json")
+
+STAGES = ("narrative", "symbol", "context", "emotion", "pattern")
+
+# Condition keys and the trigger kind they index under. A rule is indexed by
+# the first condition it has in this order: all-of conditions by their first
+# item, any-of conditions by every item.
+TRIGGERS = (
+    ("symbol", "symbol", False),
+    ("symbols", "sym", False),
+    ("words", "word", False),
+    ("emotions", "emo", True),
+    ("any_symbols", "sym", True),
+    ("any_words", "word", True),
+    ("context_any", "ctx", True),
+)
+CONDITIONS = {key for key, _, _ in TRIGGERS}
+
+
+class Rule:
+    """One compiled rule"""
+    __slots__ = ("id", "stage", "priority", "order", "text", "templated", "symbol", "symbols",
+                 "any_symbols", "words", "any_words", "emotions", "context_any")
+
+    def __init__(self, spec, order):
+        self.id = spec.get("id", str(order))
+        self.stage = spec["stage"]
+        if self.stage not in STAGES:
+            raise ValueError(f"Rule {self.id!r} has unknown stage {self.stage!r}, expected one of {STAGES}")
+        when = spec.get("when", {})
+        unknown = set(when) - CONDITIONS
+        if unknown:
+            raise ValueError(f"Rule {self.id!r} has unknown conditions {sorted(unknown)}")
+
+        self.priority = spec.get("priority", 0)
+        self.order = order
+        self.text = spec["text"]
+        self.templated = "{" in self.text
+        self.symbol = when.get("symbol")
+        self.symbols = tuple(when.get("symbols", ()))
+        self.any_symbols = frozenset(when.get("any_symbols", ()))
+        self.words = tuple(word.lower() for word in when.get("words", ()))
+        self.any_words = frozenset(word.lower() for word in when.get("any_words", ()))
+        self.emotions = frozenset(when.get("emotions", ()))
+        self.context_any = frozenset(keyword.lower() for keyword in when.get("context_any", ()))
+
+    def triggers(self):
+        """Return the index keys of this rule, or an empty list if it always applies"""
+        for key, kind, any_of in TRIGGERS:
+            value = getattr(self, key)
+            if not value:
+                continue
+            if isinstance(value, str):
+                return [(kind, value)]
+            if any_of:
+                return [(kind, item) for item in value]
+            return [(kind, value[0])]
+        return []
+
+    def matches(self, facts, symbol=None):
+        if self.symbol is not None and self.symbol != symbol:
+            return False
+        if self.symbols and not all(s in facts.symbol_names for s in self.symbols):
+            return False
+        if self.any_symbols and self.any_symbols.isdisjoint(facts.symbol_names):
+            return False
+        if self.words and not all(w in facts.words for w in self.words):
+            return False
+        if self.any_words and not any(w in facts.words for w in self.any_words):
+            return False
+        if self.emotions and facts.emotion not in self.emotions:
+            return False
+        if self.context_any and self.context_any.isdisjoint(facts.context_keys):
+            return False
+        return True
+
+    def render(self, symbol=None, meaning=None):
+        if self.templated:
+            return self.text.format(symbol=symbol, meaning=meaning)
+        return self.text
+
+    def __repr__(self):
+        return f"Rule({self.id!r}, {self.stage!r}, priority={self.priority})"
+
+
+class RuleFacts:
+    """What the rules can see of one request: symbols, words, emotion and context"""
+
+    def __init__(self, features, emotion, context):
+        self.symbol_names = features.symbol_names
+        self.words = features.positions
+        self.emotion = emotion
+
+        # Every prefix of every context word, so keywords match words that start with them
+        self.context_keys = set()
+        for word in WORD_PATTERN.findall(context.lower() if context else ""):
+            self.context_keys.update(word[:i] for i in range(1, len(word) + 1))
+        self.candidates = {}
+
+    def present(self, kind):
+        """The trigger values of one kind that this request has"""
+        if kind == "sym":
+            return self.symbol_names
+        if kind == "word":
+            return self.words.keys()
+        if kind == "emo":
+            return {self.emotion}
+        if kind == "ctx":
+            return self.context_keys
+        return ()
+
+
+def rule_order(rule):
+    return (-rule.priority, rule.order)
+
+
+class RuleEngine:
+    """Rules grouped by stage and indexed by trigger
+
+    Within a stage, rules are tried from the highest priority down, in file
+    order for equal priorities. Only rules indexed under a trigger present in
+    the request, plus the rules without conditions, are evaluated.
+    """
+
+    def __init__(self, specs):
+        self.rules = [Rule(spec, order) for order, spec in enumerate(specs)]
+        # Changes with any edit to the rules, for cache keys
+        self.fingerprint = hashlib.sha256(json.dumps(specs, sort_keys=True).encode("utf-8")).hexdigest()
+        # stage -> trigger kind -> trigger value -> rules in evaluation order
+        self.index = {stage: {} for stage in STAGES}
+        self.always = {stage: [] for stage in STAGES}
+
+        for rule in self.rules:
+            triggers = rule.triggers()
+            if not triggers:
+                self.always[rule.stage].append(rule)
+            for kind, value in triggers:
+                self.index[rule.stage].setdefault(kind, {}).setdefault(value, []).append(rule)
+
+        for stage in STAGES:
+            self.always[stage].sort(key=rule_order)
+            for by_value in self.index[stage].values():
+                for rules in by_value.values():
+                    rules.sort(key=rule_order)
+
+    def __len__(self):
+        return len(self.rules)
+
+    def facts(self, features, emotion, context):
+        """Return the rule facts of a request, built once per features, emotion and context"""
+        key = (self, emotion, context)
+        facts = features.rule_facts.get(key)
+        if facts is None:
+            facts = features.rule_facts[key] = RuleFacts(features, emotion, context)
+        return facts
+
+    def candidates(self, stage, facts):
+        """Rules of a stage whose trigger is present, in evaluation order"""
+        cached = facts.candidates.get(stage)
+        if cached is not None:
+            return cached
+
+        found = {}
+        for kind, by_value in self.index[stage].items():
+            if kind == "symbol":
+                continue
+            # Set intersection walks whichever side is smaller
+            for value in by_value.keys() & facts.present(kind):
+                for rule in by_value[value]:
+                    found[rule.order] = rule
+
+        candidates = self.always[stage]
+        if found:
+            candidates = sorted([*found.values(), *candidates], key=rule_order)
+        facts.candidates[stage] = candidates
+        return candidates
+
+    def first(self, stage, facts, symbol=None, meaning=None):
+        """Render the highest-priority matching rule of a stage, or return None"""
+        candidates = self.candidates(stage, facts)
+        if symbol is not None:
+            specific = self.index[stage].get("symbol", {}).get(symbol)
+            if specific:
+                candidates = sorted([*specific, *candidates], key=rule_order)
+
+        for rule in candidates:
+            if rule.matches(facts, symbol):
+                return rule.render(symbol, meaning)
+        return None
+
+    def all(self, stage, facts):
+        """Render every matching rule of a stage, in priority order"""
+        return [rule.render() for rule in self.candidates(stage, facts) if rule.matches(facts)]
+
+
+def load_rules(path=DEFAULT_RULES_PATH):
+    """Load and compile the rules file"""
+    with open(path, encoding="utf-8") as f:
+        return RuleEngine(json.load(f)["rules"])
@@ -0,0 +1,187 @@
+import math
+import os
+import struct
+import threading
+import zlib
+
+import numpy as np
+
+from dream_journal import valid_journal_id
+from dream_lexicon import WORD_PATTERN
+
+# Default directory for the per-journal vector files, next to the journal database
+DEFAULT_VECTORS_DIR = "dream_vectors"
+
+# Embedding width: words and symbols are hashed into this many dimensions
+DIM = 256
+
+# Symbols say more about a dream than any single word
+SYMBOL_WEIGHT = 2.0
+
+# Words too common in dream descriptions to tell dreams apart
+STOPWORDS = frozenset(
+    "a an and are as at be been but by did do for from had has have he her him his i i'm "
+    "in into is it it's its me my of on or our she so that the then there they this to "
+    "up was we were what when where which while who with you your".split()
+)
+
+# File layout: a header, then fixed-size records of (entry id, vector)
+HEADER = struct.Struct("<8sI4x")
+MAGIC = b"DRMVEC1\0"
+
+
+def record_dtype(dim):
+    return np.dtype([("id", "<i8"), ("vector", "<f4", (dim,))])
+
+
+def embed(words, symbols, dim=DIM):
+    """Hashed bag-of-words vector of a dream, with its symbols as extra features
+
+    Each word and symbol is hashed to a dimension and a sign; counts are
+    dampened with 1 + log(count) and the vector is L2-normalized, so a dot
+    product of two vectors is their cosine similarity.
+    """
+    counts = {}
+    for word in words:
+        if word not in STOPWORDS:
+            counts[word] = counts.get(word, 0) + 1
+
+    vector = np.zeros(dim, dtype=np.float32)
+    features = [(word, 1 + math.log(count)) for word, count in counts.items()]
+    features += [("symbol:" + symbol, SYMBOL_WEIGHT) for symbol in symbols]
+    for feature, weight in features:
+        h = zlib.crc32(feature.encode("utf-8"))
+        vector[h % dim] += weight if h & 0x80000000 else -weight
+
+    norm = np.linalg.norm(vector)
+    if norm:
+        vector /= norm
+    return vector
+
+
+def embed_entry(entry, dim=DIM):
+    """Embed a journal entry as stored by JournalStore"""
+    words = [word.lower() for word in WORD_PATTERN.findall(entry["dream"])]
+    return embed(words, [s["symbol"] for s in entry["symbols"]], dim)
+
+
+class VectorFile:
+    """Append-only file of (entry id, vector) records, memory-mapped for search
+
+    New records are appended with a single write, so readers never see a
+    torn record; the map is refreshed when the file has grown.
+    """
+
+    def __init__(self, path, dim=DIM):
+        self.path = path
+        self.dim = dim
+        self.dtype = record_dtype(dim)
+        self.records = None
+        self.mapped_size = 0
+
+        if os.path.exists(path) and os.path.getsize(path) >= HEADER.size:
+            with open(path, "rb") as f:
+                magic, file_dim = HEADER.unpack(f.read(HEADER.size))
+            if magic != MAGIC or file_dim != dim:
+                raise ValueError(f"{path} is not a {dim}-dimensional dream vector file")
+        else:
+            with open(path, "wb") as f:
+                f.write(HEADER.pack(MAGIC, dim))
+
+    def append(self, ids, vectors):
+        records = np.empty(len(ids), dtype=self.dtype)
+        records["id"] = ids
+        records["vector"] = vectors
+        with open(self.path, "ab") as f:
+            f.write(records.tobytes())
+
+    def load(self):
+        """Return the records as a read-only memory-mapped array"""
+        size = os.path.getsize(self.path)
+        if self.records is None or size != self.mapped_size:
+            count = (size - HEADER.size) // self.dtype.itemsize
+            if count:
+                self.records = np.memmap(self.path, dtype=self.dtype, mode="r", offset=HEADER.size, shape=(count,))
+            else:
+                self.records = np.empty(0, dtype=self.dtype)
+            self.mapped_size = size
+        return self.records
+
+    def __len__(self):
+        return len(self.load())
+
+    def last_id(self):
+        records = self.load()
+        return int(records["id"][-1]) if len(records) else 0
+
+
+class SimilarityIndex:
+    """Nearest past dreams of each journal, by cosine similarity of dream embeddings
+
+    Every journal has its own vector file in directory. The index follows the
+    journal store: before each search, entries added since the last indexed
+    id are embedded and appended, whichever process wrote them. A search is
+    one matrix-vector product over the memory-mapped file.
+    """
+
+    def __init__(self, directory=DEFAULT_VECTORS_DIR, dim=DIM):
+        self.directory = directory
+        self.dim = dim
+        self.lock = threading.Lock()
+        self.files = {}
+        os.makedirs(directory, exist_ok=True)
+
+    def vector_file(self, journal_id):
+        vector_file = self.files.get(journal_id)
+        if vector_file is None:
+            if not valid_journal_id(journal_id):
+                raise ValueError(f"Invalid journal id {journal_id!r}")
+            path = os.path.join(self.directory, f"{journal_id}.vec")
+            vector_file = self.files[journal_id] = VectorFile(path, self.dim)
+        return vector_file
+
+    def sync(self, journal_id, store, batch_size=1000):
+        """Index the entries of a journal added since the last indexed one; returns how many"""
+        with self.lock:
+            vector_file = self.vector_file(journal_id)
+            added = 0
+            while True:
+                rows = store.since(journal_id, vector_file.last_id(), batch_size)
+                if not rows:
+                    return added
+                vector_file.append([entry_id for entry_id, _ in rows],
+                                   [embed_entry(entry, self.dim) for _, entry in rows])
+                added += len(rows)
+
+    def search(self, journal_id, vector, k=3, exclude=(), min_score=0.2):
+        """Return up to k (entry id, score) pairs, most similar first"""
+        with self.lock:
+            records = self.vector_file(journal_id).load()
+        if not len(records):
+            return []
+
+        scores = records["vector"] @ vector
+        # Take a few extra candidates to make up for excluded entries
+        top = min(len(scores), 2 * k + len(exclude))
+        candidates = np.argpartition(-scores, top - 1)[:top]
+        candidates = candidates[np.argsort(-scores[candidates], kind="stable")]
+
+        results = []
+        seen = set(exclude)
+        for i in candidates:
+            entry_id, score = int(records["id"][i]), float(scores[i])
+            if score < min_score or len(results) == k:
+                break
+            # Two processes syncing at once can index an entry twice
+            if entry_id not in seen:
+                seen.add(entry_id)
+                results.append((entry_id, score))
+        return results
+
+    def similar(self, journal_id, store, features, k=3, exclude=()):
+        """Return up to k (score, entry) pairs for the past dreams most like features"""
+        self.sync(journal_id, store)
+        vector = embed(features.words, [symbol for symbol, _ in features.symbols], self.dim)
+        matches = self.search(journal_id, vector, k, exclude)
+        entries = store.get(journal_id, [entry_id for entry_id, _ in matches])
+        return [(score, entries[entry_id]) for entry_id, score in matches if entry_id in entries]
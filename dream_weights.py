@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""
+Memory-mapped model weights, shared by every process on a machine
+
+A safetensors checkpoint is a JSON header followed by raw tensor data, so
+each tensor can be used in place from a memory map instead of being read
+and deserialized. Every process that loads the same file maps the same
+page-cached bytes: the weights take RAM once per machine, not once per
+worker, and loading costs a map instead of a full read.
+
+Checkpoints saved only as pytorch_model.bin can be converted once:
+
+    python dream_weights.py convert gpt2-medium gpt2-medium-safetensors/
+"""
+
+import json
+import os
+import struct
+import sys
+
+import numpy as np
+
+# safetensors dtype names and their NumPy equivalents
+DTYPES = {
+    "F64": np.float64,
+    "F32": np.float32,
+    "F16": np.float16,
+    "I64": np.int64,
+    "I32": np.int32,
+    "I16": np.int16,
+    "I8": np.int8,
+    "U8": np.uint8,
+    "BOOL": np.bool_,
+}
+
+CHECKPOINT_NAME = "model.safetensors"
+
+
+def map_safetensors(path):
+    """Return {name: tensor} for a safetensors file, each tensor a view of a memory map
+
+    The map is copy-on-write: pages are shared through the page cache and only
+    copied if a tensor is written to, which inference never does.
+    """
+    import torch
+
+    with open(path, "rb") as f:
+        header_size = struct.unpack("<Q", f.read(8))[0]
+        header = json.loads(f.read(header_size))
+    data_start = 8 + header_size
+
+    buffer = np.memmap(path, dtype=np.uint8, mode="c")
+    tensors = {}
+    for name, info in header.items():
+        if name == "__metadata__":
+            continue
+        if info["dtype"] not in DTYPES:
+            raise ValueError(f"{path}: tensor {name} has unsupported dtype {info['dtype']}")
+        start, end = info["data_offsets"]
+        array = buffer[data_start + start:data_start + end].view(DTYPES[info["dtype"]]).reshape(info["shape"])
+        tensors[name] = torch.from_numpy(array)
+    return tensors
+
+
+def checkpoint_path(model_name):
+    """Find the safetensors checkpoint of a local model directory or Hugging Face model"""
+    if os.path.isfile(model_name):
+        return model_name
+    from transformers.utils import cached_file
+    return cached_file(model_name, CHECKPOINT_NAME)
+
+
+def load_shared_model(model_name):
+    """Build a GPT-2 language model whose weights are memory-mapped from its checkpoint"""
+    import torch
+    from transformers import GPT2Config, GPT2LMHeadModel
+    from transformers.modeling_utils import no_init_weights
+
+    path = checkpoint_path(model_name)
+    config = GPT2Config.from_pretrained(os.path.dirname(path) if os.path.isfile(model_name) else model_name)
+
+    # Skip random initialization; the untouched parameter memory is released
+    # as soon as the mapped tensors replace it
+    with no_init_weights():
+        model = GPT2LMHeadModel(config)
+
+    tensors = map_safetensors(path)
+    parameters = dict(model.named_parameters())
+    missing = set(parameters) - {"lm_head.weight"}
+    for name, tensor in tensors.items():
+        # Checkpoints of the bare GPT2Model have no "transformer." prefix
+        target = name if name in parameters else f"transformer.{name}"
+        if target not in parameters:
+            continue
+        if parameters[target].shape != tensor.shape:
+            raise ValueError(f"{path}: {name} has shape {tuple(tensor.shape)}, expected {tuple(parameters[target].shape)}")
+        module_name, _, attribute = target.rpartition(".")
+        module = model.get_submodule(module_name)
+        module._parameters[attribute] = torch.nn.Parameter(tensor, requires_grad=False)
+        missing.discard(target)
+
+    if missing:
+        raise ValueError(f"{path} is missing weights: {', '.join(sorted(missing)[:5])}")
+
+    # The output projection shares the token embedding
+    model.tie_weights()
+    return model.eval()
+
+
+def convert(model_name, output_dir):
+    """Save a model as a safetensors checkpoint that load_shared_model can map"""
+    from safetensors.torch import save_file
+    from transformers import GPT2LMHeadModel, GPT2Tokenizer
+
+    model = GPT2LMHeadModel.from_pretrained(model_name)
+    os.makedirs(output_dir, exist_ok=True)
+    model.config.save_pretrained(output_dir)
+    GPT2Tokenizer.from_pretrained(model_name).save_pretrained(output_dir)
+
+    # lm_head.weight is tied to the token embedding and is not stored twice
+    state = {name: tensor.contiguous() for name, tensor in model.state_dict().items() if name != "lm_head.weight"}
+    save_file(state, os.path.join(output_dir, CHECKPOINT_NAME), metadata={"format": "pt"})
+
+
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Prepare memory-mappable model checkpoints")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    convert_parser = subparsers.add_parser("convert", help="save a model as model.safetensors")
+    convert_parser.add_argument("model", help="Hugging Face model name or local directory")
+    convert_parser.add_argument("output_dir")
+    args = parser.parse_args(argv)
+
+    convert(args.model, args.output_dir)
+    print(f"Saved {args.model} to {args.output_dir}; load it with DREAM_MODEL={args.output_dir}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,463 @@
+#!/usr/bin/env python3
+"""
+Load test for the AI Dream Interpreter Streamlit app
+Drives many concurrent browser sessions against one Streamlit server and reports
+throughput, latency percentiles, server memory per session and errors
+
+Each simulated session speaks Streamlit's own websocket protocol, like a
+browser tab: it loads the app, interprets a dream through the form, opens
+the Dream Journal and goes back, with optional think time between actions.
+All sessions share the server's cached interpreter, scheduler and journal,
+exactly as real users do. Streamlit's in-process AppTest cannot be used
+here, since it allows only one running app per process.
+
+Usage:
+    python loadtest.py                                   # 1, 4 and 16 sessions on a local server
+    python loadtest.py --sessions 8 32 --iterations 10 --think-time 0.5
+    python loadtest.py --backend gpt2 --sessions 4       # any DREAM_INTERPRETER_BACKEND
+    python loadtest.py --url http://host:8501 --pid 1234 # an already running server
+    python loadtest.py --save results.json
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+from benchmarks import percentile
+
+# Fixed seed so every run sends the same dreams
+SEED = 1234
+
+DEFAULT_SESSIONS = [1, 4, 16]
+ITERATIONS = 5
+
+# Longest an action may take before it counts as a timeout
+ACTION_TIMEOUT = 60.0
+
+SERVER_START_TIMEOUT = 60.0
+
+# Server memory is sampled this often while sessions run
+MEMORY_SAMPLE_INTERVAL = 0.1
+
+APP_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "dream_interpreter.py")
+
+INTERPRETATION_PAGE = "Dream Interpretation"
+JOURNAL_PAGE = "Dream Journal"
+
+# Building blocks of the dreams people actually describe
+OPENINGS = [
+    "Last night I dreamt that", "I had a dream where", "In my dream", "I keep having this dream where",
+    "I had the strangest dream.", "This morning I woke up from a dream where",
+]
+
+SCENES = [
+    "I was back at my old school", "I was in my childhood home", "I was walking through a dark forest",
+    "I was standing on a bridge over a river", "I was driving a car at night", "I was on a crowded train",
+    "I was at the beach with my family", "I was in a hospital I did not recognize",
+    "I was at work but the office looked different", "I was in a huge house with endless rooms",
+]
+
+EVENTS = [
+    "a snake appeared under my bed", "I started flying over the city", "I was falling and could not stop",
+    "my teeth started falling out", "a big dog was chasing me", "I was late for an exam I had not studied for",
+    "the house caught fire", "my mother was crying in the kitchen", "I was lost and could not find the door",
+    "water kept rising around me", "I found a baby in a basket", "a stranger kept following me",
+    "I realized I was naked in front of everyone", "my phone would not work when I tried to call for help",
+    "a spider crawled across the mirror", "I saw my friend who died years ago", "I was trapped in an elevator",
+    "the bridge collapsed behind me", "I won a lot of money", "my car brakes stopped working",
+]
+
+ENDINGS = [
+    "Then I woke up.", "I woke up sweating.", "It felt very real.", "", "Everything went dark and I woke up.",
+    "I still feel uneasy about it.",
+]
+
+EMOTIONS = ["Happy", "Anxious", "Scared", "Confused", "Excited", "Sad", "Peaceful", "Other"]
+
+CONTEXTS = [
+    "Work stress", "Starting a new job next week", "Moving to a new city", "Relationship changes",
+    "Exams coming up", "", "We are expecting a baby", "Recently lost a loved one", "Money worries",
+    "Nothing special, life is calm",
+]
+
+
+def make_dream(rng):
+    """One dream request: (dream, emotion, context)"""
+    events = rng.sample(EVENTS, rng.randint(1, 3))
+    dream = f"{rng.choice(OPENINGS)} {rng.choice(SCENES)}, and then {', and '.join(events)}. {rng.choice(ENDINGS)}"
+    return dream.strip(), rng.choice(EMOTIONS), rng.choice(CONTEXTS)
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def rss_kb(pid):
+    """Resident memory of a process in KB, or None where /proc is not available"""
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return None
+
+
+def start_server(port, scratch, backend=None):
+    """Run the app under streamlit on port, with its journal in the scratch directory; returns the process"""
+    env = dict(os.environ)
+    env.setdefault("DREAM_JOURNAL_DB", os.path.join(scratch, "dream_journal.db"))
+    env.setdefault("DREAM_VECTORS_DIR", os.path.join(scratch, "dream_vectors"))
+    if backend:
+        env["DREAM_INTERPRETER_BACKEND"] = backend
+
+    process = subprocess.Popen(
+        [sys.executable, "-m", "streamlit", "run", APP_SCRIPT,
+         "--server.headless", "true", "--server.port", str(port), "--server.address", "127.0.0.1",
+         "--server.fileWatcherType", "none", "--browser.gatherUsageStats", "false"],
+        env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+
+    deadline = time.monotonic() + SERVER_START_TIMEOUT
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"streamlit exited with code {process.returncode}")
+        try:
+            with urllib.request.urlopen(f"http://127.0.0.1:{port}/_stcore/health", timeout=1) as response:
+                if response.read() == b"ok":
+                    return process
+        except OSError:
+            time.sleep(0.2)
+    process.kill()
+    process.wait()
+    raise RuntimeError(f"streamlit did not become healthy within {SERVER_START_TIMEOUT:.0f}s")
+
+
+class ActionError(Exception):
+    """A failed action, reported under its kind"""
+
+    def __init__(self, kind, message):
+        super().__init__(message)
+        self.kind = kind
+
+
+class BrowserSession:
+    """One browser tab, speaking Streamlit's websocket protocol
+
+    Keeps widget values between reruns like the frontend does: every rerun
+    sends the query string and all widget states, and button triggers are
+    cleared once a run has used them.
+    """
+
+    def __init__(self, url, timeout=ACTION_TIMEOUT):
+        self.stream_url = url.rstrip("/").replace("http", "ws", 1) + "/_stcore/stream"
+        self.timeout = timeout
+        self.connection = None
+        self.query_string = ""
+        self.states = {}
+        self.widgets = {}
+
+    async def connect(self):
+        from tornado.websocket import websocket_connect
+
+        try:
+            self.connection = await asyncio.wait_for(websocket_connect(self.stream_url), self.timeout)
+        except Exception as e:
+            raise ActionError("connection", f"{type(e).__name__}: {e}")
+
+    def set_value(self, kind, label, **value):
+        """Change a widget shown by the last run, without rerunning (like editing a form field)"""
+        from streamlit.proto.WidgetStates_pb2 import WidgetState
+
+        widget = self.widgets.get((kind, label))
+        if widget is None:
+            raise ActionError("missing_widget", f"no {kind} {label!r} on the page")
+        self.states[widget.id] = WidgetState(id=widget.id, **value)
+        return widget
+
+    def select(self, label, option):
+        widget = self.widgets.get(("selectbox", label))
+        if widget is None or option not in widget.options:
+            raise ActionError("missing_widget", f"no option {option!r} in selectbox {label!r}")
+        self.set_value("selectbox", label, int_value=list(widget.options).index(option))
+
+    async def rerun(self):
+        """Rerun the script with the current widget states; returns (deltas, bytes received)"""
+        from streamlit.proto.BackMsg_pb2 import BackMsg
+
+        message = BackMsg()
+        message.rerun_script.query_string = self.query_string
+        message.rerun_script.widget_states.widgets.extend(self.states.values())
+        try:
+            await self.connection.write_message(message.SerializeToString(), binary=True)
+            return await asyncio.wait_for(self.read_run(), self.timeout)
+        except asyncio.TimeoutError:
+            raise ActionError("timeout", f"no script_finished within {self.timeout:.0f}s")
+        except ActionError:
+            raise
+        except Exception as e:
+            raise ActionError("connection", f"{type(e).__name__}: {e}")
+        finally:
+            # Buttons fire once
+            for widget_id, state in list(self.states.items()):
+                if state.WhichOneof("value") == "trigger_value":
+                    del self.states[widget_id]
+
+    async def read_run(self):
+        from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+
+        self.widgets = {}
+        deltas = received = 0
+        exception = None
+        while True:
+            data = await self.connection.read_message()
+            if data is None:
+                raise ActionError("connection", "server closed the connection")
+            received += len(data)
+            message = ForwardMsg()
+            message.ParseFromString(data)
+            kind = message.WhichOneof("type")
+
+            if kind == "delta":
+                deltas += 1
+                if message.delta.WhichOneof("type") == "new_element":
+                    element = message.delta.new_element
+                    element_type = element.WhichOneof("type")
+                    widget = getattr(element, element_type)
+                    if element_type == "exception" and not widget.is_warning:
+                        exception = f"{widget.type}: {widget.message}"
+                    elif hasattr(widget, "label") and hasattr(widget, "id"):
+                        self.widgets[element_type, widget.label] = widget
+            elif kind == "page_info_changed":
+                self.query_string = message.page_info_changed.query_string
+            elif kind == "script_finished":
+                if message.script_finished == ForwardMsg.FINISHED_WITH_COMPILE_ERROR:
+                    raise ActionError("compile_error", "the app failed to compile")
+                if exception:
+                    raise ActionError("exception", exception)
+                return deltas, received
+
+    async def close(self):
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+
+
+class LoadResults:
+    """Timings, delta counts and errors of the actions of every session"""
+
+    def __init__(self):
+        self.latencies = {}
+        self.deltas = {}
+        self.errors = {}
+        self.dreams = 0
+
+    def error(self, kind):
+        self.errors[kind] = self.errors.get(kind, 0) + 1
+
+    async def timed(self, action, coroutine_func, *args):
+        """Run and time one action; returns whether it succeeded"""
+        started = time.perf_counter()
+        try:
+            deltas, _ = await coroutine_func(*args)
+        except ActionError as e:
+            self.error(e.kind)
+            return False
+        self.latencies.setdefault(action, []).append(time.perf_counter() - started)
+        self.deltas.setdefault(action, []).append(deltas)
+        return True
+
+
+async def run_session(url, results, iterations, rng, think_time, stream):
+    """One user: load the app, then interpret dreams and check the journal, iterations times"""
+    session = BrowserSession(url)
+
+    async def think():
+        if think_time:
+            # Exponential think time, as users do not act on a fixed beat
+            await asyncio.sleep(rng.expovariate(1 / think_time))
+
+    async def interpret(dream, emotion, context):
+        session.set_value("text_area", "Describe your dream in detail:", string_value=dream)
+        session.select("How did you feel during the dream?", emotion)
+        session.set_value("text_input", "What's happening in your life right now?", string_value=context)
+        session.set_value("button", "🔮 Interpret My Dream", trigger_value=True)
+        return await session.rerun()
+
+    async def open_page(page):
+        session.select("Choose a section:", page)
+        return await session.rerun()
+
+    try:
+        await session.connect()
+        if not await results.timed("load", session.rerun):
+            return session
+        if not stream:
+            session.set_value("checkbox", "⚡ Stream interpretation", bool_value=False)
+
+        for _ in range(iterations):
+            await think()
+            if not await results.timed("interpret", interpret, *make_dream(rng)):
+                break
+            results.dreams += 1
+
+            await think()
+            if not await results.timed("journal", open_page, JOURNAL_PAGE):
+                break
+            await think()
+            if not await results.timed("back", open_page, INTERPRETATION_PAGE):
+                break
+    except ActionError as e:
+        results.error(e.kind)
+    return session
+
+
+async def sample_memory(pid, samples, stop):
+    while not stop.is_set():
+        value = rss_kb(pid)
+        if value is not None:
+            samples.append(value)
+        try:
+            await asyncio.wait_for(stop.wait(), MEMORY_SAMPLE_INTERVAL)
+        except asyncio.TimeoutError:
+            pass
+
+
+async def run_level(url, sessions, iterations, think_time, stream, pid=None, seed=SEED):
+    """Run sessions concurrent users to completion and summarize them"""
+    results = LoadResults()
+    rss_before = rss_kb(pid) if pid else None
+    samples = []
+    stop = asyncio.Event()
+    sampler = asyncio.ensure_future(sample_memory(pid, samples, stop)) if pid else None
+
+    started = time.perf_counter()
+    # Sessions stay connected until every one has finished, so their server state is all alive at once
+    done = await asyncio.gather(*(run_session(url, results, iterations, random.Random(seed + i), think_time, stream)
+                                  for i in range(sessions)))
+    elapsed = time.perf_counter() - started
+    rss_after = rss_kb(pid) if pid else None
+
+    stop.set()
+    if sampler:
+        await sampler
+    for session in done:
+        await session.close()
+
+    latencies = sorted(t for times in results.latencies.values() for t in times)
+    summary = {
+        "sessions": sessions,
+        "actions": len(latencies),
+        "dreams": results.dreams,
+        "elapsed_s": elapsed,
+        "actions_per_sec": len(latencies) / elapsed,
+        "dreams_per_sec": results.dreams / elapsed,
+        "p50_ms": percentile(latencies, 50) * 1000 if latencies else None,
+        "p99_ms": percentile(latencies, 99) * 1000 if latencies else None,
+        "by_action": {},
+        "errors": results.errors,
+    }
+    for action, times in results.latencies.items():
+        times = sorted(times)
+        summary["by_action"][action] = {
+            "count": len(times),
+            "p50_ms": percentile(times, 50) * 1000,
+            "p99_ms": percentile(times, 99) * 1000,
+            "deltas": sum(results.deltas[action]) / len(times),
+        }
+    if rss_before is not None and rss_after is not None:
+        summary["rss_before_mb"] = rss_before / 1024
+        summary["rss_peak_mb"] = max(samples + [rss_after]) / 1024
+        summary["rss_after_mb"] = rss_after / 1024
+        summary["per_session_kb"] = (rss_after - rss_before) / sessions
+    return summary
+
+
+def print_results(levels):
+    print(f"{'sessions':>8} {'actions/s':>10} {'dreams/s':>9} {'p50 ms':>9} {'p99 ms':>9} "
+          f"{'RSS MB':>8} {'peak MB':>8} {'KB/sess':>8} {'errors':>7}")
+    print("-" * 86)
+    for level in levels:
+        memory = (f"{level['rss_after_mb']:>8.1f} {level['rss_peak_mb']:>8.1f} {level['per_session_kb']:>8.0f}"
+                  if "rss_after_mb" in level else f"{'':>8} {'':>8} {'':>8}")
+        p50 = f"{level['p50_ms']:>9.1f}" if level["p50_ms"] is not None else f"{'-':>9}"
+        p99 = f"{level['p99_ms']:>9.1f}" if level["p99_ms"] is not None else f"{'-':>9}"
+        print(f"{level['sessions']:>8} {level['actions_per_sec']:>10.1f} {level['dreams_per_sec']:>9.1f} "
+              f"{p50} {p99} {memory} {sum(level['errors'].values()):>7}")
+
+    print(f"\n{'sessions':>8} {'action':<10} {'count':>7} {'p50 ms':>9} {'p99 ms':>9} {'deltas':>7}")
+    print("-" * 55)
+    for level in levels:
+        for action, m in level["by_action"].items():
+            print(f"{level['sessions']:>8} {action:<10} {m['count']:>7} {m['p50_ms']:>9.1f} {m['p99_ms']:>9.1f} "
+                  f"{m['deltas']:>7.1f}")
+        for kind, count in level["errors"].items():
+            print(f"{level['sessions']:>8} ❌ {count} {kind} errors")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the Streamlit app with concurrent sessions")
+    parser.add_argument("--sessions", type=int, nargs="+", default=DEFAULT_SESSIONS,
+                        help="concurrent sessions; one run per value")
+    parser.add_argument("--iterations", type=int, default=ITERATIONS, help="dreams interpreted per session")
+    parser.add_argument("--think-time", type=float, default=0.0,
+                        help="mean seconds between a session's actions (default: none, for peak throughput)")
+    parser.add_argument("--no-stream", action="store_true", help="turn off streamed interpretations")
+    parser.add_argument("--backend", help="DREAM_INTERPRETER_BACKEND of the local server")
+    parser.add_argument("--url", help="test a running server instead of starting one")
+    parser.add_argument("--pid", type=int, help="process id of the server at --url, to report its memory")
+    parser.add_argument("--save", metavar="PATH", help="save results as JSON")
+    args = parser.parse_args()
+
+    print("🚦 AI Dream Interpreter - Load Test")
+    print("=" * 50)
+
+    server = None
+    # The local server's journal and vectors, removed when the run ends
+    scratch = tempfile.TemporaryDirectory(prefix="dream-loadtest-")
+    try:
+        if args.url:
+            url, pid = args.url, args.pid
+        else:
+            port = free_port()
+            server = start_server(port, scratch.name, args.backend)
+            url, pid = f"http://127.0.0.1:{port}", server.pid
+            print(f"Started streamlit at {url} (pid {pid})")
+
+        # One unrecorded session loads the cached interpreter, journal and similarity index
+        asyncio.run(run_level(url, 1, 1, 0.0, not args.no_stream, seed=SEED - 1))
+        levels = []
+        for sessions in args.sessions:
+            print(f"Running {sessions} sessions x {args.iterations} dreams...")
+            levels.append(asyncio.run(run_level(url, sessions, args.iterations, args.think_time,
+                                                not args.no_stream, pid)))
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+        scratch.cleanup()
+
+    print()
+    print_results(levels)
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(levels, f, indent=2)
+        print(f"\n💾 Results saved to {args.save}")
+
+    return 1 if any(level["errors"] for level in levels) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
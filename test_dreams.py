@@ -4,9 +4,18 @@ Test script for AI Dream Interpreter
 Run this to verify your setup is working correctly
 """
 
+import os
 import sys
+import subprocess
 import importlib.util
 
+# Cold start budgets for the rule-based path (seconds)
+IMPORT_TIME_BUDGET = 0.5
+STARTUP_TIME_BUDGET = 0.1
+
+# Modules that must not be imported until a generative backend is requested
+HEAVY_MODULES = ['torch', 'transformers', 'openai', 'streamlit']
+
 def check_dependencies():
     """Check if all required packages are installed"""
     required_packages = [
@@ -62,6 +71,35 @@ def test_symbol_recognition():
         print(f"❌ Error testing symbol recognition: {e}")
         return False
 
+def test_symbol_boundaries():
+    """Test that symbols only match whole words and report their offsets"""
+    print("\n🧩 Testing Symbol Word Boundaries...")
+    
+    try:
+        from dream_interpreter import SymbolMatcher, DREAM_SYMBOLS
+        matcher = SymbolMatcher(DREAM_SYMBOLS)
+        
+        text = "My education made me scared, then a cat jumped on the car"
+        matches = matcher.find_all(text)
+        found = [m.symbol for m in matches]
+        print(f"Symbols found: {found}")
+        
+        if found != ["cat", "car"]:
+            print("❌ Unexpected symbols matched inside other words")
+            return False
+        
+        for m in matches:
+            if text[m.start:m.end].lower() != m.symbol:
+                print(f"❌ Wrong offsets for {m.symbol}: {m.start}-{m.end}")
+                return False
+        
+        print("✅ Symbols matched on word boundaries")
+        return True
+        
+    except Exception as e:
+        print(f"❌ Error testing symbol boundaries: {e}")
+        return False
+
 def test_model_loading():
     """Test if the GPT-2 model loads correctly"""
     print("\n🤖 Testing Model Loading...")
@@ -70,7 +108,20 @@ def test_model_loading():
         from dream_interpreter import DreamInterpreter
         interpreter = DreamInterpreter()
         
-        if interpreter.model and interpreter.tokenizer:
+        # A failed load is recorded for the UI without importing streamlit
+        script = (
+            "import sys\n"
+            "from dream_interpreter import DreamInterpreter\n"
+            "interpreter = DreamInterpreter(model_name='/nonexistent/model', backend='gpt2')\n"
+            "print(interpreter.load_model(), bool(interpreter.load_error), 'streamlit' in sys.modules)\n"
+        )
+        result = subprocess.run([sys.executable, "-c", script], capture_output=True, text=True, check=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__)))
+        if result.stdout.split() != ["False", "True", "False"]:
+            print(f"❌ Failed load not recorded headlessly: {result.stdout.strip()}")
+            return False
+        
+        if interpreter.load_model():
             print("✅ GPT-2 model loaded successfully")
             return True
         else:
@@ -81,6 +132,321 @@ def test_model_loading():
         print(f"❌ Error loading model: {e}")
         return False
 
+def test_shared_weights():
+    """Test that memory-mapped weights give the same model as a regular load"""
+    print("\n🧠 Testing Shared Model Weights...")
+    
+    try:
+        import tempfile
+        import torch
+        from transformers import GPT2Config, GPT2LMHeadModel
+        from dream_weights import load_shared_model
+        
+        # A tiny random model, saved as safetensors like the converted checkpoints
+        directory = tempfile.mkdtemp()
+        torch.manual_seed(0)
+        GPT2LMHeadModel(GPT2Config(n_layer=2, n_head=2, n_embd=32, vocab_size=100, n_positions=64)).save_pretrained(
+            directory, safe_serialization=True
+        )
+        
+        shared = load_shared_model(directory)
+        regular = GPT2LMHeadModel.from_pretrained(directory).eval()
+        input_ids = torch.tensor([[1, 5, 42, 7]])
+        with torch.no_grad():
+            same = torch.allclose(shared(input_ids).logits, regular(input_ids).logits)
+        if not same:
+            print("❌ Memory-mapped model gives different logits")
+            return False
+        if shared.lm_head.weight.data_ptr() != shared.transformer.wte.weight.data_ptr():
+            print("❌ Output projection is not tied to the mapped embedding")
+            return False
+        
+        print("✅ Memory-mapped weights match a regular load")
+        return True
+        
+    except ImportError:
+        print("⚠️  torch or transformers not installed, skipping")
+        return True
+    except Exception as e:
+        print(f"❌ Error testing shared weights: {e}")
+        return False
+
+def test_generation_backend():
+    """Test the CPU-tuned GPT-2 path: Conv1D conversion, quantization and the latency budget"""
+    print("\n⚙️  Testing Generation Backend...")
+    
+    try:
+        import copy
+        import json
+        import tempfile
+        import torch
+        from transformers import GPT2Config, GPT2LMHeadModel
+        from transformers.models.gpt2.tokenization_gpt2 import bytes_to_unicode
+        from transformers.pytorch_utils import Conv1D
+        from dream_interpreter import DreamInterpreter, convert_conv1d_to_linear
+        
+        # A tiny random model with a byte-level tokenizer, so nothing is downloaded
+        directory = tempfile.mkdtemp()
+        vocab = {char: i for i, char in enumerate(bytes_to_unicode().values())}
+        vocab["<|endoftext|>"] = len(vocab)
+        with open(os.path.join(directory, "vocab.json"), "w") as f:
+            json.dump(vocab, f)
+        with open(os.path.join(directory, "merges.txt"), "w") as f:
+            f.write("#version: 0.2\n")
+        torch.manual_seed(0)
+        config = GPT2Config(n_layer=2, n_head=2, n_embd=32, vocab_size=len(vocab), n_positions=256,
+                            bos_token_id=len(vocab) - 1, eos_token_id=len(vocab) - 1)
+        GPT2LMHeadModel(config).save_pretrained(directory, safe_serialization=True)
+        
+        original = GPT2LMHeadModel.from_pretrained(directory).eval()
+        converted = copy.deepcopy(original)
+        convert_conv1d_to_linear(converted)
+        input_ids = torch.tensor([[1, 5, 42, 7]])
+        with torch.no_grad():
+            same = torch.allclose(original(input_ids).logits, converted(input_ids).logits, atol=1e-5)
+        if not same or any(isinstance(m, Conv1D) for m in converted.modules()):
+            print("❌ Conv1D conversion changed the logits or left Conv1D layers")
+            return False
+        
+        interpreter = DreamInterpreter(model_name=directory, backend="gpt2", quantize=True, max_new_tokens=8)
+        if not interpreter.load_model():
+            print(f"❌ Tiny model did not load: {interpreter.load_error}")
+            return False
+        if not any("quantized" in type(m).__module__ for m in interpreter.model.modules()):
+            print("❌ Model was not dynamically quantized")
+            return False
+        if len(interpreter.generate_model_interpretations([("I was flying", "Happy", "", [])])) != 1:
+            print("❌ Generation did not return one result per request")
+            return False
+        
+        # Past the latency budget the rules answer instead
+        interpreter.latency_budget = 1e-6
+        dream = ("A dog chased me through the forest", "Scared", "Work stress", [])
+        if interpreter.generate_interpretation(*dream) != interpreter.create_comprehensive_interpretation(*dream):
+            print("❌ Exhausted latency budget did not fall back to the rules")
+            return False
+        
+        print("✅ Converted, quantized model generates and falls back past the budget")
+        return True
+        
+    except ImportError:
+        print("⚠️  torch or transformers not installed, skipping")
+        return True
+    except Exception as e:
+        print(f"❌ Error testing generation backend: {e}")
+        return False
+
+def test_remote_backend():
+    """Test the OpenAI-compatible backend against the local stand-in server"""
+    print("\n🛰️  Testing Remote Backend...")
+    
+    try:
+        from dream_interpreter import DreamInterpreter
+        from dream_openai import BackendUnavailable, OpenAICompatibleClient, StubCompletionServer
+        
+        stub = StubCompletionServer(delay=0.05).start()
+        client = OpenAICompatibleClient(stub.url, max_concurrency=4, timeout=1.0)
+        interpreter = DreamInterpreter(backend="openai", client=client, latency_budget=2.0)
+        rules = DreamInterpreter()
+        
+        # Without the openai package the client fails once, remembers it, and the rules answer
+        missing = OpenAICompatibleClient(stub.url)
+        installed = sys.modules.pop("openai", None)
+        sys.modules["openai"] = None
+        failures = 0
+        try:
+            missing.complete_many([[]], 1.0)
+        except BackendUnavailable:
+            failures += 1
+        # Put openai back: the second call must not try the import again
+        del sys.modules["openai"]
+        if installed is not None:
+            sys.modules["openai"] = installed
+        try:
+            missing.complete_many([[]], 1.0)
+        except BackendUnavailable:
+            failures += 1
+        fallback = DreamInterpreter(backend="openai", client=missing).generate_interpretation("I was flying", "Happy", "", [])
+        if failures != 2 or fallback != rules.generate_interpretation("I was flying", "Happy", "", []):
+            print("❌ Missing openai package not reported as BackendUnavailable")
+            return False
+        
+        if importlib.util.find_spec("openai") is None:
+            # Without the client library every dream falls back to the rules
+            interpretation = interpreter.generate_interpretation("I was flying", "Happy", "", [])
+            print("⚠️  openai is not installed, checked the rule-based fallback only")
+            return interpretation == rules.generate_interpretation("I was flying", "Happy", "", [])
+        
+        requests = [(f"Dream number {i}", "Happy", "", [], None) for i in range(12)]
+        interpretations = interpreter.generate_interpretations(requests)
+        print(f"Requests: {stub.requests}, connections: {stub.connections}")
+        
+        if not all(text.startswith("This dream of Dream number") for text in interpretations):
+            print("❌ Remote interpretations missing")
+            return False
+        if stub.connections > 4:
+            print("❌ Connections were not pooled")
+            return False
+        
+        # A slow endpoint falls back to the rules within the latency budget
+        stub.delay = 2.0
+        interpreter.latency_budget = 0.3
+        interpretation = interpreter.generate_interpretation("Deep water", "Anxious", "", [])
+        if interpretation != rules.generate_interpretation("Deep water", "Anxious", "", []):
+            print("❌ Slow endpoint did not fall back")
+            return False
+        
+        client.close()
+        stub.close()
+        print("✅ Remote backend pooled connections and fell back when slow")
+        return True
+        
+    except Exception as e:
+        print(f"❌ Error testing remote backend: {e}")
+        return False
+
+def test_lexicon():
+    """Test that the compiled lexicon maps synonyms to one shared meaning"""
+    print("\n📖 Testing Symbol Lexicon...")
+    
+    try:
+        from dream_lexicon import Lexicon, compile_lexicon
+        from dream_interpreter import SymbolMatcher
+        
+        lexicon = Lexicon(compile_lexicon([
+            (["death", "dying"], "transformation, ending of a phase, rebirth"),
+            (["teeth falling out"], "anxiety about appearance or communication"),
+            (["falling"], "loss of control"),
+        ]))
+        matcher = SymbolMatcher(lexicon)
+        
+        found = matcher.identify("Dying in my dream, my teeth falling out")
+        print(f"Symbols found: {found}")
+        
+        if [symbol for symbol, _ in found] != ["death", "teeth falling out", "falling"]:
+            print("❌ Synonyms or multi-word terms not resolved")
+            return False
+        if lexicon["dying"] != lexicon["death"] or len(lexicon) != 4:
+            print("❌ Lexicon mapping is inconsistent")
+            return False
+        
+        # Inflected forms from the generated table resolve to their symbols
+        from dream_interpreter import DreamInterpreter
+        interpreter = DreamInterpreter()
+        found = [symbol for symbol, _ in interpreter.identify_symbols("I flew past snakes and was chased")]
+        print(f"Inflected symbols found: {found}")
+        
+        if found != ["flying", "snake", "chase"]:
+            print("❌ Inflected forms not matched")
+            return False
+        
+        # Curly apostrophes match like straight ones; verb forms that are also nouns do not match
+        found = [symbol for symbol, _ in interpreter.identify_symbols("The dog’s bark. A fly landed in the fall")]
+        print(f"Possessive and noun homographs: {found}")
+        if found != ["dog"]:
+            print("❌ Curly possessive missed or noun homograph matched")
+            return False
+        
+        print("✅ Lexicon resolved synonyms, inflections and multi-word terms")
+        return True
+        
+    except Exception as e:
+        print(f"❌ Error testing lexicon: {e}")
+        return False
+
+def test_rule_engine():
+    """Test that rules fire by priority and only triggered rules are evaluated"""
+    print("\n📜 Testing Rule Engine...")
+    
+    try:
+        from dream_rules import RuleEngine
+        from dream_interpreter import DreamInterpreter
+        
+        rules = [
+            {"id": "default", "stage": "narrative", "text": "General."},
+            {"id": "chase", "stage": "narrative", "priority": 10, "when": {"symbols": ["chase"]}, "text": "Chase."},
+            {"id": "chase-dog", "stage": "narrative", "priority": 20, "when": {"symbols": ["chase", "dog"]}, "text": "Dog chase."},
+            {"id": "work", "stage": "context", "when": {"context_any": ["work"]}, "text": "Work."},
+            {"id": "meaning", "stage": "symbol", "text": "The {symbol} means {meaning}."},
+        ]
+        # Plenty of rules that never trigger for these dreams
+        rules += [{"stage": "narrative", "priority": 50, "when": {"words": [f"word{i}"]}, "text": "Unused."}
+                  for i in range(5000)]
+        engine = RuleEngine(rules)
+        interpreter = DreamInterpreter(rules=engine)
+        
+        features = interpreter.extract_features("A dog was chasing me")
+        facts = engine.facts(features, "Anxious", "Working late")
+        results = [
+            interpreter.analyze_core_narrative(features, "Anxious", ""),
+            interpreter.analyze_core_narrative(interpreter.extract_features("Chased again"), "Anxious", ""),
+            interpreter.analyze_core_narrative(interpreter.extract_features("Nothing"), "Anxious", ""),
+            interpreter.analyze_emotional_context("Anxious", "Working late", features),
+            interpreter.analyze_symbols_in_context([("dog", "loyalty")], features, "Anxious"),
+        ]
+        print(f"Rule outputs: {results}")
+        
+        if results != ["Dog chase.", "Chase.", "General.", "Work.", "The dog means loyalty."]:
+            print("❌ Rules did not fire in priority order")
+            return False
+        if len(engine.candidates("narrative", facts)) != 3:
+            print("❌ Untriggered rules were evaluated")
+            return False
+        
+        # "chasing" is grouped under "chase", so the shipped dog-chase rules apply to it
+        shipped = DreamInterpreter()
+        dream = "A dog was chasing me"
+        interpretation = shipped.create_comprehensive_interpretation(dream, "Scared", "", shipped.identify_symbols(dream))
+        if "Being chased by a dog" not in interpretation or "The dog chasing you" not in interpretation:
+            print("❌ Dog-chasing interpretation not given for 'chasing'")
+            return False
+        
+        print("✅ Rule engine fired the right rules from the index")
+        return True
+        
+    except Exception as e:
+        print(f"❌ Error testing rule engine: {e}")
+        return False
+
+def test_startup_budget():
+    """Test that importing the module and building an interpreter stays cheap"""
+    print("\n⏱️  Testing Startup Budget...")
+    
+    # Run in a fresh interpreter so nothing is already imported
+    script = (
+        "import sys, time\n"
+        "t0 = time.perf_counter()\n"
+        "import dream_interpreter\n"
+        "t1 = time.perf_counter()\n"
+        "dream_interpreter.DreamInterpreter()\n"
+        "t2 = time.perf_counter()\n"
+        f"heavy = [m for m in {HEAVY_MODULES!r} if m in sys.modules]\n"
+        "print(t1 - t0, t2 - t1, ','.join(heavy))\n"
+    )
+    
+    try:
+        result = subprocess.run([sys.executable, "-c", script], capture_output=True,
+                                text=True, check=True, cwd=os.path.dirname(os.path.abspath(__file__)))
+        import_time, startup_time, heavy = (result.stdout.strip().split(" ") + [""])[:3]
+        import_time, startup_time = float(import_time), float(startup_time)
+        
+        print(f"Import time: {import_time * 1000:.1f} ms (budget {IMPORT_TIME_BUDGET * 1000:.0f} ms)")
+        print(f"Startup time: {startup_time * 1000:.1f} ms (budget {STARTUP_TIME_BUDGET * 1000:.0f} ms)")
+        
+        if heavy:
+            print(f"❌ Heavy modules imported eagerly: {heavy}")
+            return False
+        if import_time > IMPORT_TIME_BUDGET or startup_time > STARTUP_TIME_BUDGET:
+            print("❌ Startup budget exceeded")
+            return False
+        
+        print("✅ Startup within budget")
+        return True
+        
+    except Exception as e:
+        print(f"❌ Error measuring startup time: {e}")
+        return False
+
 def test_interpretation_generation():
     """Test the dream interpretation generation"""
     print("\n🔮 Testing Dream Interpretation...")
@@ -112,6 +478,572 @@ def test_interpretation_generation():
         print(f"❌ Error generating interpretation: {e}")
         return False
 
+def test_streaming():
+    """Test that streamed interpretations match the batch path and failed streams are not cached"""
+    print("\n⚡ Testing Streaming...")
+    
+    try:
+        from dream_interpreter import DreamInterpreter, InterpretationCache
+        
+        interpreter = DreamInterpreter()
+        dreams = [
+            ("I was flying over the ocean", "Happy", "New job"),
+            ("A snake chased me through my old school", "Scared", ""),
+            ("Nothing much happened", "Other", "Exams"),
+        ]
+        for dream_text, emotion, context in dreams:
+            features = interpreter.extract_features(dream_text)
+            streamed = "".join(interpreter.stream_interpretation(dream_text, emotion, context, features.symbols, features))
+            if streamed != interpreter.generate_interpretation(dream_text, emotion, context, features.symbols, features):
+                print(f"❌ Streamed text differs from generate_interpretation for {dream_text!r}")
+                return False
+        
+        # A model stream that fails part way is shown but not cached
+        def failing_stream(*args):
+            yield "This dream shows a first complete sentence."
+            raise RuntimeError("generation thread died")
+        
+        model = DreamInterpreter(backend="gpt2", cache=InterpretationCache())
+        model.load_model = lambda: True
+        model.stream_model_interpretation = failing_stream
+        fragments = list(model.stream_interpretation("I was flying", "Happy", "", []))
+        if fragments != ["This dream shows a first complete sentence."] or model.cache.stats()["size"]:
+            print(f"❌ Failed stream handled incorrectly: {fragments}")
+            return False
+        
+        # One that fails before any text falls back to the rules, which are cached
+        def empty_stream(*args):
+            raise RuntimeError("no text within the budget")
+            yield
+        
+        model.stream_model_interpretation = empty_stream
+        fallback = "".join(model.stream_interpretation("I was flying", "Happy", "", []))
+        if fallback != model.create_comprehensive_interpretation("I was flying", "Happy", "", []) or model.cache.stats()["size"] != 1:
+            print("❌ Failed stream did not fall back to the rules")
+            return False
+        
+        # Model streams are bounded
+        if not (model.acquire_stream() and model.acquire_stream()) or model.acquire_stream():
+            print("❌ Model streams not bounded by max_streams")
+            return False
+        
+        print("✅ Streams match the batch path and failures are not cached")
+        return True
+        
+    except Exception as e:
+        print(f"❌ Error testing streaming: {e}")
+        return False
+
+def test_scheduler():
+    """Test that batched interpretations match direct ones"""
+    print("\n📦 Testing Interpretation Scheduler...")
+    
+    try:
+        from concurrent.futures import ThreadPoolExecutor
+        from dream_interpreter import DreamInterpreter, InterpretationScheduler
+        
+        interpreter = DreamInterpreter()
+        scheduler = InterpretationScheduler(interpreter, max_batch_size=4, max_wait=0.01)
+        
+        dreams = [
+            "I was flying over the ocean and saw a snake",
+            "I was being chased by a dog back to where I started",
+            "I was in my childhood house but couldn't find the door",
+        ] * 4
+        
+        with ThreadPoolExecutor(max_workers=len(dreams)) as pool:
+            results = list(pool.map(lambda dream: scheduler.interpret(dream, "Anxious", "work", timeout=5), dreams))
+        
+        for dream, result in zip(dreams, results):
+            expected = interpreter.generate_interpretation(
+                dream, "Anxious", "work", interpreter.identify_symbols(dream)
+            )
+            if result != expected:
+                print(f"❌ Scheduler result differs for: {dream}")
+                return False
+        
+        print(f"✅ {len(results)} concurrent jobs interpreted correctly")
+        return True
+        
+    except Exception as e:
+        print(f"❌ Error testing scheduler: {e}")
+        return False
+
+def test_interpretation_cache():
+    """Test that repeated requests are served from the cache"""
+    print("\n🗃️  Testing Interpretation Cache...")
+    
+    try:
+        from dream_interpreter import DreamInterpreter, InterpretationCache
+        
+        cache = InterpretationCache(max_size=2)
+        interpreter = DreamInterpreter(cache=cache)
+        
+        dreams = ["I was flying over water", "  i was FLYING over water ", "A fire in my house", "Lost in a forest"]
+        results = [interpreter.generate_interpretation(dream, "Happy", "", interpreter.identify_symbols(dream))
+                   for dream in dreams]
+        stats = cache.stats()
+        print(f"Cache stats: {stats}")
+        
+        if results[0] != results[1]:
+            print("❌ Normalized duplicate returned a different interpretation")
+            return False
+        if stats["hits"] != 1 or stats["misses"] != 3 or stats["evictions"] != 1:
+            print("❌ Unexpected cache counters")
+            return False
+        
+        # Other models, symbols or rules must not share cached interpretations
+        from dream_rules import RuleEngine
+        versions = {
+            interpreter.cache_version(),
+            DreamInterpreter(backend="gpt2", model_name="gpt2").cache_version(),
+            DreamInterpreter(backend="gpt2", model_name="gpt2-medium").cache_version(),
+            DreamInterpreter(symbols={"water": "emotions"}).cache_version(),
+            DreamInterpreter(rules=RuleEngine([])).cache_version(),
+        }
+        if len(versions) != 5 or DreamInterpreter().cache_version() != interpreter.cache_version():
+            print("❌ Cache version does not follow the model, lexicon and rules")
+            return False
+        
+        print("✅ Cache hits, misses and evictions counted correctly")
+        return True
+        
+    except Exception as e:
+        print(f"❌ Error testing interpretation cache: {e}")
+        return False
+
+def test_batch_processing():
+    """Test that batch mode skips malformed records without losing the others"""
+    print("\n📦 Testing Batch Processing...")
+    
+    try:
+        import io
+        import json
+        import tempfile
+        from dream_interpreter import batch_main, run_batch
+        
+        records = [
+            {"dream": "I was flying over the ocean", "emotion": "Happy", "context": "New job"},
+            {"dream": 123},
+            {"dream": "A snake in my house", "context": 5},
+            {"dream_text": "My teeth fell out", "emotion": "Anxious", "context": None},
+            ["not", "an", "object"],
+        ]
+        input_file = io.StringIO("\n".join(json.dumps(r) for r in records) + "\n{not json\n")
+        output_file = io.StringIO()
+        written, errors = run_batch(input_file, output_file, workers=1, chunk_size=10)
+        
+        dreams = sorted(json.loads(line)["dream"] for line in output_file.getvalue().splitlines())
+        print(f"Written: {written}, skipped: {errors}")
+        if dreams != ["I was flying over the ocean", "My teeth fell out"] or errors != 4:
+            print("❌ Malformed records not skipped correctly")
+            return False
+        
+        # Skips only fail the run with --strict
+        directory = tempfile.mkdtemp()
+        input_path, output_path = os.path.join(directory, "in.jsonl"), os.path.join(directory, "out.jsonl")
+        with open(input_path, "w") as f:
+            f.write(input_file.getvalue())
+        statuses = [batch_main([input_path, output_path, "--workers", "1"] + flags) for flags in ([], ["--strict"])]
+        if statuses != [0, 1]:
+            print(f"❌ Unexpected exit statuses {statuses}")
+            return False
+        
+        print("✅ Valid records interpreted, malformed ones counted")
+        return True
+        
+    except Exception as e:
+        print(f"❌ Error testing batch processing: {e}")
+        return False
+
+def test_journal_store():
+    """Test that the journal store pages entries newest first"""
+    print("\n📚 Testing Journal Store...")
+    
+    try:
+        from dream_interpreter import create_dream_journal_entry
+        from dream_journal import JournalStore
+        
+        store = JournalStore(":memory:")
+        for i in range(12):
+            entry = create_dream_journal_entry(f"Dream number {i}", "Happy", "", "Interpretation", [("cat", "independence")])
+            store.append("test-journal", entry)
+        store.append("other-journal", entry)
+        
+        first_page = store.page("test-journal", page=0, page_size=5)
+        last_page = store.page("test-journal", page=2, page_size=5)
+        print(f"First page: {[e['dream'] for e in first_page]}")
+        
+        if store.count("test-journal") != 12:
+            print("❌ Wrong entry count")
+            return False
+        if first_page[0]["dream"] != "Dream number 11" or len(last_page) != 2:
+            print("❌ Pages are not newest first")
+            return False
+        if first_page[0]["symbols"] != [{"symbol": "cat", "meaning": "independence"}]:
+            print("❌ Symbols did not round-trip")
+            return False
+        
+        print("✅ Journal entries stored and paginated correctly")
+        return True
+        
+    except Exception as e:
+        print(f"❌ Error testing journal store: {e}")
+        return False
+
+def call_api(app, method, path, body=None, query=""):
+    """Send one request to an ASGI app; returns (status, parsed JSON body)"""
+    import asyncio
+    import json
+    
+    messages = []
+    
+    async def receive():
+        return {"type": "http.request", "body": json.dumps(body).encode() if body is not None else b""}
+    
+    async def send(message):
+        messages.append(message)
+    
+    scope = {"type": "http", "method": method, "path": path, "query_string": query.encode()}
+    asyncio.run(app(scope, receive, send))
+    return messages[0]["status"], json.loads(messages[1]["body"])
+
+def test_journal_patterns():
+    """Test that pattern counters follow appends and are backfilled for old journals"""
+    print("\n📈 Testing Journal Patterns...")
+    
+    try:
+        import os
+        import tempfile
+        from dream_interpreter import create_dream_journal_entry
+        from dream_journal import JournalStore
+        
+        path = os.path.join(tempfile.mkdtemp(), "journal.db")
+        store = JournalStore(path)
+        dates = ["2024-01-01 08:00:00", "2024-01-02 08:00:00", "2024-02-10 08:00:00"]
+        for date, emotion in zip(dates, ["Happy", "Anxious", "Anxious"]):
+            entry = create_dream_journal_entry("A dream", emotion, "", "", [("water", "emotions"), ("dog", "loyalty")], date)
+            store.append("patterns-test", entry)
+        
+        months = store.trends("patterns-test", "emotion", "month")
+        print(f"Emotions by month: {months}")
+        if months != [("2024-01", "Anxious", 1), ("2024-01", "Happy", 1), ("2024-02", "Anxious", 1)]:
+            print("❌ Emotion counters are wrong")
+            return False
+        if len(store.trends("patterns-test", "symbol", "day", buckets=2)) != 4:
+            print("❌ Trends not limited to the latest buckets")
+            return False
+        
+        # A batch with a bad date is rejected whole, and the next append does not commit part of it
+        good = create_dream_journal_entry("A dream", "Calm", "", "", [("dog", "loyalty")], "2024-03-01 08:00:00")
+        bad = dict(good, date="not a date")
+        try:
+            store.append_many("patterns-test", [good, bad])
+            print("❌ Bad date accepted")
+            return False
+        except ValueError:
+            pass
+        store.append("other-journal", good)
+        if store.count("patterns-test") != 3 or store.top("patterns-test", "symbol") != [("dog", 3), ("water", 3)]:
+            print("❌ Failed batch left entries or counters behind")
+            return False
+        
+        # A journal written before the counters existed is counted on open
+        store.db.execute("DELETE FROM stats")
+        store.db.execute("PRAGMA user_version = 0")
+        store.db.commit()
+        store.close()
+        store = JournalStore(path)
+        top = store.top("patterns-test", "symbol")
+        print(f"Top symbols after migration: {top}")
+        if top != [("dog", 3), ("water", 3)]:
+            print("❌ Counters not rebuilt")
+            return False
+        
+        print("✅ Pattern counters maintained incrementally")
+        return True
+        
+    except Exception as e:
+        print(f"❌ Error testing journal patterns: {e}")
+        return False
+
+def test_journal_archive():
+    """Test that a journal survives export and import with symbols stored as ids"""
+    print("\n📦 Testing Journal Archive...")
+    
+    try:
+        import gzip
+        import io
+        import json
+        from dream_archive import export_journal, import_journal
+        from dream_interpreter import DREAM_SYMBOLS, create_dream_journal_entry
+        from dream_journal import JournalStore
+        
+        store = JournalStore(":memory:")
+        for i in range(5):
+            symbols = [("water", DREAM_SYMBOLS["water"]), ("custom", "a symbol from an older lexicon")]
+            store.append("archive-test", create_dream_journal_entry(f"Dream {i}", "Calm", "", "Interpretation", symbols))
+        
+        archive = io.BytesIO()
+        exported = export_journal(store, "archive-test", archive, chunk_size=2)
+        lines = gzip.decompress(archive.getvalue()).decode("utf-8").splitlines()
+        print(f"Exported {exported} entries in {len(archive.getvalue())} bytes")
+        
+        # Each meaning is written once, not once per entry
+        if sum(DREAM_SYMBOLS["water"] in line for line in lines) != 1:
+            print("❌ Symbol meanings duplicated in the archive")
+            return False
+        
+        archive.seek(0)
+        copy = JournalStore(":memory:")
+        journal_id, imported, skipped = import_journal(copy, archive, "copy", chunk_size=2)
+        original = [entry for _, entry in store.since("archive-test", 0)]
+        restored = [entry for _, entry in copy.since("copy", 0)]
+        if imported != 5 or skipped or restored != original:
+            print("❌ Entries did not round-trip")
+            return False
+        
+        # Entries with a bad date or an unknown symbol are skipped, not written
+        bad = [json.dumps(["yesterday", "Bad", "Calm", "", "", []]), json.dumps(["2024-01-01", "Bad", "Calm", "", "", [99]])]
+        damaged = io.BytesIO(gzip.compress(("\n".join(lines[:3] + bad + lines[3:]) + "\n").encode("utf-8")))
+        journal_id, imported, skipped = import_journal(copy, damaged, "damaged")
+        if imported != 5 or skipped != 2 or copy.count("damaged") != 5:
+            print("❌ Malformed archive entries not skipped")
+            return False
+        
+        print("✅ Journal exported and imported intact")
+        return True
+        
+    except Exception as e:
+        print(f"❌ Error testing journal archive: {e}")
+        return False
+
+def test_similarity_index():
+    """Test that similar past dreams are found and the index follows the journal"""
+    print("\n🔗 Testing Similarity Index...")
+    
+    try:
+        import tempfile
+        from dream_interpreter import DreamInterpreter, create_dream_journal_entry
+        from dream_journal import JournalStore
+        from dream_similarity import SimilarityIndex
+        
+        interpreter = DreamInterpreter()
+        store = JournalStore(":memory:")
+        directory = tempfile.mkdtemp()
+        index = SimilarityIndex(directory)
+        
+        for dream in ["I was flying over the ocean", "A dog chased me through the forest", "My teeth fell out"]:
+            store.append("similar-test", create_dream_journal_entry(dream, "Happy", "", "", interpreter.identify_symbols(dream)))
+        
+        features = interpreter.extract_features("Flying high above the sea")
+        similar = index.similar("similar-test", store, features, k=2)
+        print(f"Similar dreams: {[(round(score, 2), entry['dream']) for score, entry in similar]}")
+        
+        if not similar or similar[0][1]["dream"] != "I was flying over the ocean":
+            print("❌ Most similar dream not found first")
+            return False
+        
+        # New entries are picked up incrementally, and a fresh index reads the same file
+        entry_id = store.append("similar-test", create_dream_journal_entry("Flying over the sea", "Happy", "", "", []))
+        similar = index.similar("similar-test", store, features, k=3, exclude={entry_id})
+        reopened = SimilarityIndex(directory)
+        if any(entry["dream"] == "Flying over the sea" for _, entry in similar) or index.sync("similar-test", store) != 0:
+            print("❌ Excluded or duplicate entries returned")
+            return False
+        if len(reopened.vector_file("similar-test")) != 4:
+            print("❌ Vector file not persisted")
+            return False
+        
+        # Ids from URLs name vector files, so only plain ids are accepted
+        from dream_journal import valid_journal_id
+        if not valid_journal_id("similar-test") or any(valid_journal_id(i) for i in ["my.journal", "../x", "id\n", "", None]):
+            print("❌ Journal id validation accepts unsafe ids")
+            return False
+        
+        print("✅ Similar dreams found from the memory-mapped index")
+        return True
+        
+    except Exception as e:
+        print(f"❌ Error testing similarity index: {e}")
+        return False
+
+def test_api():
+    """Test the JSON API endpoints, backpressure and timeouts"""
+    print("\n🌐 Testing JSON API...")
+    
+    try:
+        import threading
+        from dream_api import DreamAPI
+        from dream_journal import JournalStore
+        
+        app = DreamAPI(journal=JournalStore(":memory:"), workers=1, max_pending=1, timeout=0.5)
+        
+        status, entry = call_api(app, "POST", "/interpret",
+                                 {"dream": "A dog chased me", "emotion": "Scared", "journal_id": "api-test"})
+        print(f"Interpreted: {status} {[s['symbol'] for s in entry.get('symbols', [])]}")
+        if status != 200 or entry["id"] != 1 or not entry["interpretation"]:
+            print("❌ Interpretation request failed")
+            return False
+        
+        status, batch = call_api(app, "POST", "/interpret/batch",
+                                 {"dreams": [{"dream": "Flying"}, {"dream": "Water", "journal_id": "api-test"}]})
+        status_page, page = call_api(app, "GET", "/journal/api-test", query="page=0")
+        if status != 200 or len(batch["entries"]) != 2 or status_page != 200 or page["total"] != 2:
+            print("❌ Batch or journal request failed")
+            return False
+        
+        if call_api(app, "POST", "/interpret", {"emotion": "Happy"})[0] != 400:
+            print("❌ Invalid request was not rejected")
+            return False
+        
+        # Hold the only slot: the next request is refused, then one times out
+        release = threading.Event()
+        app.executor.submit(release.wait)
+        app.slots.acquire()
+        busy = call_api(app, "POST", "/interpret", {"dream": "Busy"})[0]
+        app.slots.release()
+        timed_out = call_api(app, "POST", "/interpret", {"dream": "Queued"})[0]
+        release.set()
+        print(f"Busy: {busy}, timed out: {timed_out}")
+        if busy != 503 or timed_out != 504:
+            print("❌ Backpressure or timeout not applied")
+            return False
+        
+        # A slow job keeps running after its 504, but must not save: a retry is safe
+        import time
+        generate = app.interpreter.generate_interpretation
+        app.interpreter.generate_interpretation = lambda *args: time.sleep(0.8) or generate(*args)
+        slow = call_api(app, "POST", "/interpret", {"dream": "Slow", "journal_id": "api-test"})[0]
+        app.executor.submit(lambda: None).result()
+        app.interpreter.generate_interpretation = generate
+        if slow != 504 or call_api(app, "GET", "/journal/api-test")[1]["total"] != 2:
+            print("❌ Timed-out request was saved to the journal")
+            return False
+        
+        app.close()
+        print("✅ API served interpretations and journals with backpressure")
+        return True
+        
+    except Exception as e:
+        print(f"❌ Error testing API: {e}")
+        return False
+
+def test_metrics():
+    """Test the Prometheus histogram output and the disabled no-op path"""
+    print("\n📈 Testing Metrics...")
+    
+    try:
+        from dream_metrics import NULL_TIMER, Metrics
+        
+        metrics = Metrics(enabled=True)
+        for seconds in (0.0007, 0.003, 20.0):
+            metrics.observe("identify_symbols", seconds)
+        metrics.inc("cache_hit", 2)
+        text = metrics.render_prometheus()
+        expected = [
+            'dream_stage_seconds_bucket{stage="identify_symbols",le="0.0005"} 0',
+            'dream_stage_seconds_bucket{stage="identify_symbols",le="0.001"} 1',
+            'dream_stage_seconds_bucket{stage="identify_symbols",le="0.0025"} 1',
+            'dream_stage_seconds_bucket{stage="identify_symbols",le="0.005"} 2',
+            'dream_stage_seconds_bucket{stage="identify_symbols",le="10.0"} 2',
+            'dream_stage_seconds_bucket{stage="identify_symbols",le="+Inf"} 3',
+            'dream_stage_seconds_count{stage="identify_symbols"} 3',
+            'dream_events_total{event="cache_hit"} 2',
+        ]
+        missing = [line for line in expected if line not in text.splitlines()]
+        if missing:
+            print(f"❌ Missing or wrong Prometheus lines: {missing}")
+            return False
+        
+        disabled = Metrics()
+        with disabled.timer("identify_symbols") as timer:
+            pass
+        disabled.observe("identify_symbols", 0.1)
+        disabled.inc("cache_hit")
+        if timer is not NULL_TIMER or disabled.histograms or disabled.counters or "dream_stage_seconds_bucket" in disabled.render_prometheus():
+            print("❌ Disabled metrics recorded something")
+            return False
+        
+        server = metrics.serve(0)
+        host = server.server_address[0]
+        server.shutdown()
+        server.server_close()
+        if host != "127.0.0.1":
+            print(f"❌ Metrics endpoint listens on {host} by default")
+            return False
+        
+        print("✅ Cumulative buckets rendered and disabled metrics are a no-op")
+        return True
+        
+    except Exception as e:
+        print(f"❌ Error testing metrics: {e}")
+        return False
+
+def test_render_fragments():
+    """Test that page sections render as single, escaped HTML fragments"""
+    print("\n🖼️ Testing Page Fragments...")
+    
+    try:
+        import dream_render as render
+        from dream_interpreter import DREAM_SYMBOLS
+        
+        symbols = [("water", "emotions & <subconscious>"), ("snake", "transformation")]
+        fragment = render.symbols_html(symbols)
+        if fragment.count('class="symbol-box"') != 2 or "<subconscious>" in fragment:
+            print("❌ Symbol boxes not rendered or not escaped")
+            return False
+        
+        # A blank line would end the HTML block and show the rest as text
+        groups = list(DREAM_SYMBOLS.groups())
+        reference = render.symbol_reference_html(groups)
+        entry = render.entry_html({"dream": "Line one\n\nline two", "emotion": "Calm", "context": "",
+                                   "interpretation": "", "symbols": [{"symbol": "water", "meaning": "emotions"}]})
+        if any("\n\n" in html for html in (fragment, reference, entry, render.insights_html("Happy"))):
+            print("❌ Fragment contains a blank line")
+            return False
+        if reference.count("<p>") != len(groups):
+            print("❌ Symbol reference incomplete")
+            return False
+        
+        print(f"✅ {len(groups)} symbol groups rendered as one fragment")
+        return True
+        
+    except Exception as e:
+        print(f"❌ Error testing page fragments: {e}")
+        return False
+
+def test_load_harness():
+    """Test that the load-test harness can drive the app's pages"""
+    print("\n🚦 Testing Load Harness...")
+    
+    try:
+        import asyncio
+        import tempfile
+        import loadtest
+        
+        port = loadtest.free_port()
+        with tempfile.TemporaryDirectory() as scratch:
+            server = loadtest.start_server(port, scratch)
+            try:
+                level = asyncio.run(loadtest.run_level(f"http://127.0.0.1:{port}", 2, 1, 0.0, True, server.pid))
+            finally:
+                server.terminate()
+                server.wait()
+        
+        print(f"Actions: {level['actions']}, errors: {level['errors']}")
+        # A renamed widget or a page that raises shows up as an error here
+        if level["errors"] or level["dreams"] != 2:
+            print("❌ Simulated sessions did not complete")
+            return False
+        
+        print(f"✅ 2 sessions completed at p50 {level['p50_ms']:.0f} ms")
+        return True
+        
+    except Exception as e:
+        print(f"❌ Error testing load harness: {e}")
+        return False
+
 def test_streamlit_compatibility():
     """Test if Streamlit can import the main module"""
     print("\n🌐 Testing Streamlit Compatibility...")
@@ -138,8 +1070,27 @@ def main():
     tests = [
         ("Dependencies", check_dependencies),
         ("Symbol Recognition", test_symbol_recognition),
+        ("Symbol Boundaries", test_symbol_boundaries),
+        ("Symbol Lexicon", test_lexicon),
+        ("Rule Engine", test_rule_engine),
+        ("Startup Budget", test_startup_budget),
         ("Model Loading", test_model_loading),
+        ("Shared Weights", test_shared_weights),
+        ("Generation Backend", test_generation_backend),
+        ("Remote Backend", test_remote_backend),
         ("Interpretation Generation", test_interpretation_generation),
+        ("Streaming", test_streaming),
+        ("Interpretation Scheduler", test_scheduler),
+        ("Interpretation Cache", test_interpretation_cache),
+        ("Batch Processing", test_batch_processing),
+        ("Journal Store", test_journal_store),
+        ("Journal Patterns", test_journal_patterns),
+        ("Journal Archive", test_journal_archive),
+        ("Similarity Index", test_similarity_index),
+        ("JSON API", test_api),
+        ("Metrics", test_metrics),
+        ("Page Fragments", test_render_fragments),
+        ("Load Harness", test_load_harness),
         ("Streamlit Compatibility", test_streamlit_compatibility)
     ]
     
@@ -166,6 +1117,8 @@ def main():
     else:
         print("⚠️  Some tests failed. Please check the error messages above.")
         print("Make sure all dependencies are installed correctly.")
+    
+    return passed == total
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    sys.exit(0 if main() else 1)
\ No newline at end of file